@@ -57,6 +57,7 @@ class XRayCreatorPlugin(InterfaceActionBase):
         __prefs__.defaults['create_send_end_actions'] = False
         __prefs__.defaults['file_preference'] = 'mobi'
         __prefs__.defaults['tld'] = None
+        __prefs__.defaults['author_cache_days'] = 14
         __prefs__['plugin_path'] = self.plugin_path
 
         if __prefs__.has_key('mobi') and __prefs__.has_key('azw3'):
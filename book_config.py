@@ -173,7 +173,7 @@ class BookConfigWidget(QDialog):
         asin = None
         self.set_status_and_repaint('Searching for ASIN...')
         if self.book.title != 'Unknown' and self.book.author != 'Unknown':
-            asin = self.book.search_for_asin_on_amazon(self.book.title_and_author)
+            asin = self.book.search_for_asin_on_amazon(self.book.title_and_author, force=True)
         if asin:
             self._status.setText('ASIN found.')
             asin_browser_button.setEnabled(True)
@@ -213,9 +213,9 @@ class BookConfigWidget(QDialog):
         url = None
         self.set_status_and_repaint('Searching for Goodreads url...')
         if self.book.asin:
-            url = self.book.search_for_goodreads_url(self.book.asin)
+            url = self.book.search_for_goodreads_url(self.book.asin, force=True)
         if not url and self.book.title != 'Unknown' and self.book.author != 'Unknown':
-            url = self.book.search_for_goodreads_url(self.book.title_and_author)
+            url = self.book.search_for_goodreads_url(self.book.title_and_author, force=True)
         if url:
             self._status.setText('Goodreads url found.')
             self._update_aliases_button.setEnabled(True)
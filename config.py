@@ -9,7 +9,7 @@ __license__ = 'GPL v3'
 __copyright__ = '2016, Samreen Zarroug, Anthony Toole, & Alex Mayer'
 __docformat__ = 'restructuredtext en'
 
-from PyQt5.Qt import QButtonGroup, QRadioButton, QCheckBox
+from PyQt5.Qt import QButtonGroup, QRadioButton, QCheckBox, QLabel, QSpinBox
 from PyQt5.Qt import QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QGroupBox, QFrame
 
 from calibre.gui2 import error_dialog
@@ -60,6 +60,14 @@ class ConfigWidget(QWidget):
         self._settings['overwrite_when_sending'].setChecked(__prefs__['overwrite_when_sending'])
         layout.addWidget(self._settings['overwrite_when_sending'])
 
+        author_cache_layout = QHBoxLayout()
+        author_cache_layout.addWidget(QLabel('Refresh saved author bios, photos, and other books after (days):'))
+        self._settings['author_cache_days'] = QSpinBox()
+        self._settings['author_cache_days'].setRange(0, 365)
+        self._settings['author_cache_days'].setValue(__prefs__['author_cache_days'])
+        author_cache_layout.addWidget(self._settings['author_cache_days'])
+        layout.addLayout(author_cache_layout)
+
     def _intialize_file_settings(self, layout):
         '''Initialize file creation/sending settings'''
         separator_a = QFrame()
@@ -140,7 +148,7 @@ class ConfigWidget(QWidget):
 
     def save_settings(self):
         '''Saves current settings into preferences json file'''
-        special = ['file_preference_azw3', 'file_preference_mobi', 'mobi', 'azw3']
+        special = ['file_preference_azw3', 'file_preference_mobi', 'mobi', 'azw3', 'author_cache_days']
         for setting, value in self._settings.items():
             if setting not in special:
                 __prefs__[setting] = value.isChecked()
@@ -150,4 +158,5 @@ class ConfigWidget(QWidget):
         elif self._settings['file_preference_azw3'].isChecked():
             __prefs__['file_preference'] = 'azw3'
 
+        __prefs__['author_cache_days'] = self._settings['author_cache_days'].value()
         __prefs__['formats'] = [fmt for fmt in ['mobi', 'azw3'] if self._settings[fmt].isChecked()]
@@ -0,0 +1,37 @@
+# amazon_search.py
+'''Finds kindle books in amazon search result pages without parsing the whole page'''
+
+import re
+
+# everything the scanner cares about inside the results column
+RESULT_TOKEN_PAT = re.compile(r'(<div\b)|(</div\s*>)|data\-asin="([a-zA-Z0-9]+)"|(Buy now with 1\-Click)')
+
+def find_kindle_asin(page):
+    '''
+    Returns ASIN of the first result in page's results column that can be bought with 1-Click; Returns None if none can
+
+    The results column is scanned token by token, keeping track of how deep into its divs we are so the scan stops at
+    the end of the column, and returns as soon as a qualifying result is seen.
+    '''
+    column_start = page.find('id="resultsCol"')
+    if column_start == -1:
+        return None
+    column_start = page.rfind('<div', 0, column_start)
+    if column_start == -1:
+        return None
+
+    depth = 0
+    asin = None
+    for token in RESULT_TOKEN_PAT.finditer(page, column_start):
+        div_start, div_end, result_asin, one_click = token.groups()
+        if div_start:
+            depth += 1
+        elif div_end:
+            depth -= 1
+            if depth == 0:
+                return None
+        elif result_asin:
+            asin = result_asin
+        elif one_click and asin:
+            return asin
+    return None
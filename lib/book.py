@@ -5,6 +5,7 @@ import os
 import json
 import struct
 from datetime import datetime
+from copy import deepcopy
 from cStringIO import StringIO
 from shutil import copy
 
@@ -15,14 +16,15 @@ from calibre_plugins.xray_creator.lib.utilities import LIBRARY
 from calibre_plugins.xray_creator.lib.status_info import StatusInfo
 from calibre_plugins.xray_creator.lib.book_parser import BookParser
 from calibre_plugins.xray_creator.lib.book_settings import BookSettings
-from calibre_plugins.xray_creator.lib.exceptions import PageDoesNotExist
+from calibre_plugins.xray_creator.lib.exceptions import PageDoesNotExist, JobAborted
 from calibre_plugins.xray_creator.lib.xray_db_writer import XRayDBWriter
 from calibre_plugins.xray_creator.lib.goodreads_parser import GoodreadsParser
+from calibre_plugins.xray_creator.lib.concurrent_goodreads_parser import ConcurrentGoodreadsParser
 
 class Book(object):
     '''Class to hold book information and creates/sends files depending on user settings'''
 
-    def __init__(self, database, book_id, connections, settings):
+    def __init__(self, database, book_id, connections, settings, book_settings=None):
         self._basic_info = {'book_id': book_id, 'xray_send_fmt': None}
         self._goodreads_conn = connections['goodreads']
         self._settings = settings
@@ -34,7 +36,7 @@ class Book(object):
                           'end_actions': StatusInfo(), 'end_actions_send': StatusInfo()}
 
         self._goodreads_data = {}
-        self._book_settings = BookSettings(database, book_id, connections)
+        self._book_settings = book_settings if book_settings else BookSettings(database, book_id, connections)
         self._get_basic_information(database, settings['formats'])
 
         if self._statuses['general'].status != StatusInfo.FAIL:
@@ -88,6 +90,14 @@ class Book(object):
     def title(self):
         return self._basic_info['title']
 
+    @property
+    def goodreads_url(self):
+        return self._basic_info.get('goodreads_url')
+
+    @property
+    def asin(self):
+        return self._basic_info.get('asin')
+
     @property
     def author(self):
         return self._basic_info['author']
@@ -181,8 +191,14 @@ class Book(object):
         if self._settings['create_send_end_actions']:
             self._statuses['end_actions'].status = StatusInfo.IN_PROGRESS
 
-    def create_files_event(self, create_file_params, log, notifications, abort):
-        '''Creates and sends files depending on user's settings'''
+    def create_files_event(self, create_file_params, log, notifications, abort, task_pool=None, page_cache=None,
+                           goodreads_data=None):
+        '''
+        Creates and sends files depending on user's settings; Fetches Goodreads pages on task_pool if given
+
+        goodreads_data is a Task shared by books with the same goodreads page and ASIN; Its result is used instead of
+        parsing goodreads for this book.
+        '''
         title_and_author = self.title_and_author
         device_books, perc, total = create_file_params
 
@@ -207,7 +223,8 @@ class Book(object):
                                'Parsing {0} Goodreads data'.format(title_and_author)))
             log('{0}    Parsing Goodreads data...'.format(datetime.now().strftime('%m-%d-%Y %H:%M:%S')))
             self._parse_goodreads_data(create_xray=create_xray, create_author_profile=author_profile,
-                                       create_start_actions=start_actions, create_end_actions=end_actions)
+                                       create_start_actions=start_actions, create_end_actions=end_actions,
+                                       task_pool=task_pool, page_cache=page_cache, goodreads_data=goodreads_data)
             perc += 1
             if self._statuses['general'].status is StatusInfo.FAIL:
                 return
@@ -289,8 +306,9 @@ class Book(object):
             perc += 1
         return files_to_send
 
-    def send_files_event(self, send_file_params, log, notifications, abort):
-        '''Sends files to device depending on user's settings'''
+    def send_files_event(self, send_file_params, log, notifications, abort, task_pool=None, page_cache=None,
+                         goodreads_data=None):
+        '''Sends files to device depending on user's settings; Takes the same optional arguments as create_files_event'''
         device_books, book_num, total = send_file_params
 
         if abort.isSet():
@@ -305,7 +323,8 @@ class Book(object):
                                                               self.title_and_author))
             create_xray = True if create_xray_format_info != None else False
             self._parse_goodreads_data(create_xray=create_xray, create_author_profile=create_author_profile,
-                                       create_start_actions=create_start_actions, create_end_actions=create_end_actions)
+                                       create_start_actions=create_start_actions, create_end_actions=create_end_actions,
+                                       task_pool=task_pool, page_cache=page_cache, goodreads_data=goodreads_data)
             if self._statuses['general'].status is StatusInfo.FAIL:
                 return
             if create_xray and self._statuses['xray'].status != StatusInfo.FAIL:
@@ -354,7 +373,8 @@ class Book(object):
         return amt_completed/total if amt_completed/total >= .01 else .01
 
     def _parse_goodreads_data(self, create_xray=None, create_author_profile=None,
-                              create_start_actions=None, create_end_actions=None):
+                              create_start_actions=None, create_end_actions=None, task_pool=None, page_cache=None,
+                              goodreads_data=None):
         if create_xray is None:
             create_xray = self._settings['create_send_xray']
         if create_author_profile is None:
@@ -365,14 +385,20 @@ class Book(object):
             create_end_actions = self._settings['create_send_end_actions']
 
         try:
-            goodreads_data = GoodreadsParser(self._basic_info['goodreads_url'], self._goodreads_conn,
-                                             self._basic_info['asin'])
-            results = goodreads_data.parse(create_xray=create_xray, create_author_profile=create_author_profile,
-                                           create_start_actions=create_start_actions, create_end_actions=create_end_actions)
+            if goodreads_data:
+                # copied since the results are shared with the other books in the group
+                results = deepcopy(goodreads_data.result())
+            else:
+                results = self.read_goodreads_data(task_pool, page_cache, create_xray, create_author_profile,
+                                                   create_start_actions, create_end_actions)
             compiled_xray, compiled_author_profile, compiled_start_actions, compiled_end_actions = results
         except PageDoesNotExist:
             self._statuses['general'].set(StatusInfo.FAIL, StatusInfo.F_COULD_NOT_PARSE_GOODREADS_DATA)
             return
+        except JobAborted:
+            # failing the book stops both events before they touch goodreads data that was never read
+            self._statuses['general'].set(StatusInfo.FAIL, StatusInfo.F_JOB_ABORTED)
+            return
 
         if create_xray:
             self._process_goodreads_xray_results(compiled_xray)
@@ -383,6 +409,19 @@ class Book(object):
         if create_end_actions:
             self._process_goodreads_end_actions_results(compiled_end_actions)
 
+    def read_goodreads_data(self, task_pool, page_cache, create_xray, create_author_profile, create_start_actions,
+                            create_end_actions):
+        '''Parses book's goodreads page and returns compiled x-ray, author profile, start actions, and end actions'''
+        if task_pool:
+            goodreads_parser = ConcurrentGoodreadsParser(self._basic_info['goodreads_url'], self._goodreads_conn,
+                                                         self._basic_info['asin'], task_pool=task_pool,
+                                                         page_cache=page_cache)
+        else:
+            goodreads_parser = GoodreadsParser(self._basic_info['goodreads_url'], self._goodreads_conn,
+                                               self._basic_info['asin'], page_cache=page_cache)
+        return goodreads_parser.parse(create_xray=create_xray, create_author_profile=create_author_profile,
+                                      create_start_actions=create_start_actions, create_end_actions=create_end_actions)
+
     def _process_goodreads_xray_results(self, compiled_xray):
         '''Checks if goodreads sucessfully retrieved xray data; Updates status if not'''
         if compiled_xray:
@@ -3,7 +3,13 @@
 
 import os
 import re
-from struct import unpack, error
+import zlib
+import mmap
+import hashlib
+import itertools
+import multiprocessing
+from array import array
+from struct import unpack_from, error
 from random import randrange
 
 from calibre.ebooks.mobi import MobiError
@@ -11,7 +17,83 @@ from calibre.ebooks.mobi.huffcdic import HuffReader
 from calibre.ebooks.mobi.reader.mobi6 import MobiReader
 from calibre.ebooks.compression.palmdoc import decompress_doc
 
+from calibre_plugins.xray_creator.lib.disk_cache import get_cache
+from calibre_plugins.xray_creator.lib.task_pool import TaskPool
+
 PARAGRAPH_PAT = re.compile(r'<p.*?>.+?(?:<\/p>)', re.I)
+PARAGRAPH_START_PAT = re.compile(r'<p', re.I)
+TAG_PAT = re.compile(r'<[^>]*>?')
+
+# HUFF/CDIC books with fewer text records than this (about 10MB of text) are decompressed in this process;
+# starting calibre worker processes costs more than it saves
+PARALLEL_MIN_RECORDS = 2500
+PARALLEL_MAX_WORKERS = 4
+
+# run in calibre worker processes, which can't import the plugin's modules
+UNPACK_WORKER_SOURCE = '''
+from calibre.ebooks.mobi.huffcdic import HuffReader
+
+def unpack_records(huffs, records):
+    unpack = HuffReader(huffs).unpack
+    return [unpack(record) for record in records]
+'''
+
+# text extracted from books on earlier runs; least recently used books are dropped past this size
+TEXT_CACHE_SIZE = 200 * 1024 * 1024
+
+class BookFile(object):
+    '''
+    Memory maps a MOBI/AZW3 file so its headers can be read without reading the whole file
+
+    It can be read like a file so the same mapping is handed to MobiExtractor and the file is only read from disk once.
+    '''
+    def __init__(self, book_path):
+        self._book_path = book_path
+        with open(book_path, 'rb') as book:
+            try:
+                self._data = mmap.mmap(book.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                # empty files can't be mapped
+                raise MobiError('Unable to read book.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def fingerprint(self):
+        '''Identifies this exact version of the file by its path, size, modification time, and content hash'''
+        stat = os.stat(self._book_path)
+        return u'{0}|{1}|{2!r}|{3}'.format(self._book_path, stat.st_size, stat.st_mtime,
+                                           hashlib.sha1(self._data).hexdigest())
+
+    @property
+    def header(self):
+        '''Returns book's erl and codec from the PalmDOC and MOBI headers in record 0'''
+        try:
+            nrecs, = unpack_from('>H', self._data, 76)
+            recs_start = 78 + (nrecs * 8) + 2
+            erl, = unpack_from('>L', self._data, recs_start + 4)
+            codec = 'cp1252' if unpack_from('>L', self._data, recs_start + 28)[0] == 1252 else 'utf8'
+            return erl, codec
+        except error:
+            raise MobiError
+
+    def seek(self, position):
+        '''Moves to position in the file'''
+        self._data.seek(position)
+
+    def read(self, size=-1):
+        '''Reads size bytes, or the rest of the file if size isn't given'''
+        if size < 0:
+            size = len(self._data) - self._data.tell()
+        return self._data.read(size)
+
+    def close(self):
+        '''Unmaps the file'''
+        self._data.close()
 
 class BookParser(object):
     '''Class to parse book using information from user and goodreads'''
@@ -52,8 +134,9 @@ class BookParser(object):
 
     def parse(self):
         '''Parses book'''
-        erl, codec = self.find_erl_and_encoding()
-        notable_clips, excerpt_data = self._parse_paragraph_data(codec)
+        with BookFile(self._book_path) as book_file:
+            erl, codec = self.find_erl_and_encoding(book_file)
+            notable_clips, excerpt_data = self._parse_paragraph_data(codec, book_file)
 
         num_excerpts = len(excerpt_data)
         # add random excerpts to make sure notable clips has at least 20 excerpts
@@ -74,7 +157,7 @@ class BookParser(object):
                              'entity_data': self._entity_data,
                              'codec': codec}
 
-    def _parse_paragraph_data(self, codec):
+    def _parse_paragraph_data(self, codec, book_file):
         '''Parses paragraph data in book'''
         escaped_word_list = [re.escape(word) for word in self._aliases.keys() + self._entity_data.keys()]
         word_pat = re.compile(r'(\b' + r'\b|\b'.join(escaped_word_list) + r'\b)', re.I)
@@ -83,7 +166,7 @@ class BookParser(object):
         excerpt_id = 0
         excerpt_data = {}
         notable_clips = []
-        for word_loc, para_start, para_len in self._get_paragraph_data(codec):
+        for word_loc, para_start, para_len in self._get_paragraph_data(codec, book_file):
             related_entities = []
             if len(self._entity_data.keys()) > 0:
             # for each match found, fill in entity_data and excerpt_data information
@@ -99,35 +182,102 @@ class BookParser(object):
 
         return notable_clips, excerpt_data
 
-    def _get_paragraph_data(self, codec):
-        '''Gets paragraphs from book'''
-        paragraph_data = []
-        book_html = MobiExtractor(self._book_path, open(os.devnull, 'w')).extract_text()
-
+    def _get_paragraph_data(self, codec, book_file):
+        '''Yields paragraphs from book as the book's text records are extracted'''
         # find all paragraphs (sections enclosed in html p tags) and their starting offset
-        for node in re.finditer(PARAGRAPH_PAT, book_html):
-            word_loc = {'words': '', 'locs': [], 'char_sizes': []}
-
-            skip = False
-            loc = node.start(0)+self._offset
-            for i, char in enumerate(node.group(0).decode(codec)):
-                word_loc['char_sizes'].append(len(char.encode(codec)))
-                if char == '<' and not skip:
-                    skip = True
-                    if node.group(0)[i:i+3] == '<br':
-                        word_loc['words'] += ' '
-                        word_loc['locs'].append(loc)
-                if not skip:
-                    word_loc['words'] += char
-                    word_loc['locs'].append(loc)
-                if char == '>' and skip:
-                    skip = False
-                loc += len(char.encode(codec))
-
+        for para_start, paragraph in self._find_paragraphs(self._get_text_records(book_file)):
+            word_loc = self._tokenize(paragraph, codec, para_start+self._offset)
             if len(word_loc['locs']) > 0:
-                paragraph_data.append((word_loc, node.start(0)+self._offset, len(node.group(0))))
+                yield word_loc, para_start+self._offset, len(paragraph)
+
+    @staticmethod
+    def _tokenize(paragraph, codec, loc):
+        '''
+        Strips tags out of paragraph, which starts at byte offset loc in the book
+
+        Returns the words left (<br> tags become a space), the byte offset of each of their characters, and the
+        byte size of every character in the whole paragraph, tags included.
+        '''
+        text = paragraph.decode(codec)
+        if len(text) == len(paragraph):
+            # every character is a single byte
+            char_sizes = array('B', [1]) * len(text)
+            char_locs = array('i', xrange(loc, loc + len(text)))
+        else:
+            # same sizes encoding each character again would give, including surrogates on narrow python builds
+            char_sizes = array('B', [1 if code < 0x80 else 2 if code < 0x800 else 3 if code < 0x10000 else 4
+                                     for code in map(ord, text)])
+            char_locs = array('i')
+            for size in char_sizes:
+                char_locs.append(loc)
+                loc += size
+
+        words = []
+        locs = array('i')
+        start = 0
+        for tag in TAG_PAT.finditer(text):
+            words.append(text[start:tag.start(0)])
+            locs.extend(char_locs[start:tag.start(0)])
+            # checked against the undecoded paragraph at the character index like it always has been
+            if paragraph[tag.start(0):tag.start(0)+3] == '<br':
+                words.append(u' ')
+                locs.append(char_locs[tag.start(0)])
+            start = tag.end(0)
+        words.append(text[start:])
+        locs.extend(char_locs[start:])
+
+        return {'words': u''.join(words), 'locs': locs, 'char_sizes': char_sizes}
+
+    @staticmethod
+    def _get_text_records(book_file):
+        '''
+        Yields book's text records with their offsets
+
+        If the same file was extracted before, its saved text is used instead of decompressing the book again.
+        Otherwise the records are compressed as they go by and saved once they have all been extracted, so only the
+        compressed text is held on to.
+        '''
+        text_cache = get_cache('book_text', TEXT_CACHE_SIZE)
+        fingerprint = book_file.fingerprint
+        entry = text_cache.get(fingerprint)
+        if entry:
+            yield 0, entry[0]
+            return
+
+        compressor = zlib.compressobj()
+        compressed = []
+        for position, text in MobiExtractor(book_file, open(os.devnull, 'w')).iter_text():
+            compressed.append(compressor.compress(text))
+            yield position, text
+        compressed.append(compressor.flush())
+        text_cache.set_compressed(fingerprint, b''.join(compressed))
 
-        return paragraph_data
+    @staticmethod
+    def _find_paragraphs(text_records):
+        '''
+        Yields offset and html of every paragraph PARAGRAPH_PAT finds in the text records put together
+
+        PARAGRAPH_PAT can't match across newlines, so a paragraph found in the text read so far is the same one it
+        would find in the whole text, and the only text that can still start a paragraph is after the last newline.
+        That part is carried over into the next record, starting from its first '<p'.
+        '''
+        carry = b''
+        for position, text in text_records:
+            text = carry + text
+            text_start = position - len(carry)
+
+            resume = 0
+            for node in PARAGRAPH_PAT.finditer(text):
+                yield text_start + node.start(0), node.group(0)
+                resume = node.end(0)
+
+            carry = text[max(resume, text.rfind(b'\n') + 1):]
+            paragraph_start = PARAGRAPH_START_PAT.search(carry)
+            if paragraph_start:
+                carry = carry[paragraph_start.start(0):]
+            else:
+                # '<' could be the start of a paragraph that continues in the next record
+                carry = b'<' if carry.endswith(b'<') else b''
 
     def _process_match(self, match, codec, excerpt_id, word_loc):
         matched_word = match.group(1).decode(codec).lower()
@@ -174,54 +324,126 @@ class BookParser(object):
         total_len = sum(char_sizes[start:last_char+1])
         return total_len
 
-    def find_erl_and_encoding(self):
-        '''Finds book's erl and codec'''
-        with open(self._book_path, 'rb') as fname:
-            book_data = fname.read()
+    def find_erl_and_encoding(self, book_file=None):
+        '''Finds book's erl and codec; Only the headers are read'''
+        if book_file is None:
+            with BookFile(self._book_path) as book_file:
+                return self.find_erl_and_encoding(book_file)
 
-        try:
-            nrecs, = unpack('>H', book_data[76:78])
-            recs_start = 78 + (nrecs * 8) + 2
-            erl, = unpack('>L', book_data[recs_start + 4:recs_start + 8])
-            codec = 'cp1252' if unpack('>L', book_data[recs_start + 28:recs_start + 32])[0] == 1252 else 'utf8'
-            return erl, codec
-        except error:
-            raise MobiError
+        erl, codec = book_file.header
+        return erl, codec
 
 class MobiExtractor(MobiReader):
     '''Reads MOBI file'''
     def extract_text(self, offset=1):
         '''Gets text from file'''
-        text_sections = [self.text_section(i) for i in range(offset, min(self.book_header.records + offset,
-                                                                         len(self.sections)))]
-        processed_records = list(range(offset-1, self.book_header.records +
-                                       offset))
-
-        mobi_html = b''
-
+        return b''.join(text for _, text in self.iter_text(offset))
+
+    def iter_text(self, offset=1):
+        '''
+        Yields each text record, decompressed and cleaned up, with its offset in the text extract_text returns
+
+        Records are decompressed one at a time so only a couple of them are held at once.
+        '''
+        last_section = min(self.book_header.records + offset, len(self.sections))
+        # empty records don't change the text and would hide which record is the last one
+        records = (record for record in self._unpack_records(range(offset, last_section)) if record)
+
+        # need the start of the text to know if returns should be replaced
+        first_records = []
+        for record in records:
+            first_records.append(record)
+            if sum(len(first_record) for first_record in first_records) >= 300:
+                break
+        replace_returns = self.book_header.ancient and '<html' not in b''.join(first_records)[:300].lower()
+        delete_chars = b'\0'
+        if self.book_header.codec == 'cp1252':
+            delete_chars += b'\x1e\x02'  # record separator and start of text
+
+        position = 0
+        held_back = b''
+        record = None
+        for next_record in itertools.chain(first_records, records):
+            if record is not None:
+                text, held_back = self._clean_record(held_back + record, replace_returns, delete_chars, last=False)
+                yield position, text
+                position += len(text)
+            record = next_record
+
+        if record is not None:
+            if record.endswith(b'#'):
+                record = record[:-1]
+            text, _ = self._clean_record(held_back + record, replace_returns, delete_chars, last=True)
+            yield position, text
+
+    def _unpack_records(self, sections):
+        '''
+        Yields decompressed text records of sections in order
+
+        Very large HUFF/CDIC books have their records split between calibre worker processes, which are sent the
+        HUFF/CDIC tables once each. PalmDOC is decompressed by calibre's C extension so it's always done here.
+        '''
+        num_of_workers = min(PARALLEL_MAX_WORKERS, multiprocessing.cpu_count())
+        if (self.book_header.compression_type != 'DH' or len(sections) < PARALLEL_MIN_RECORDS
+                or num_of_workers < 2):
+            unpack = self._get_unpack()
+            for i in sections:
+                yield unpack(self.text_section(i))
+            return
+
+        huffs = self._get_huffs()
+        chunk_size = -(-len(sections) // num_of_workers)
+        task_pool = TaskPool(max_workers=num_of_workers)
+        tasks = []
+        for start in range(0, len(sections), chunk_size):
+            records = [self.text_section(i) for i in sections[start:start + chunk_size]]
+            tasks.append(task_pool.submit(_unpack_in_worker, huffs, records))
+        for task in tasks:
+            for record in task.result():
+                yield record
+
+    def _get_huffs(self):
+        '''Gets HUFF/CDIC records'''
+        return [self.sections[i][0] for i in range(self.book_header.huff_offset,
+                                                   self.book_header.huff_offset + self.book_header.huff_number)]
+
+    def _get_unpack(self):
+        '''Gets function that decompresses a text record'''
         if self.book_header.compression_type == 'DH':
-            huffs = [self.sections[i][0] for i in range(self.book_header.huff_offset,
-                                                        self.book_header.huff_offset + self.book_header.huff_number)]
-            processed_records += list(range(self.book_header.huff_offset,
-                                            self.book_header.huff_offset + self.book_header.huff_number))
-            huff = HuffReader(huffs)
-            huff_unpack = huff.unpack
-
+            return HuffReader(self._get_huffs()).unpack
         elif self.book_header.compression_type == '\x00\x02':
-            huff_unpack = decompress_doc
-
+            return decompress_doc
         elif self.book_header.compression_type == '\x00\x01':
-            huff_unpack = lambda x: x
-        else:
-            raise MobiError('Unknown compression algorithm: %s' % repr(self.book_header.compression_type))
-        mobi_html = b''.join(map(huff_unpack, text_sections))
-        if mobi_html.endswith(b'#'):
-            mobi_html = mobi_html[:-1]
-
-        if self.book_header.ancient and '<html' not in mobi_html[:300].lower():
-            mobi_html = mobi_html.replace('\r ', '\n\n ')
-        mobi_html = mobi_html.replace('\0', '')
-        if self.book_header.codec == 'cp1252':
-            mobi_html = mobi_html.replace('\x1e', '')  # record separator
-            mobi_html = mobi_html.replace('\x02', '')  # start of text
-        return mobi_html
+            return lambda x: x
+        raise MobiError('Unknown compression algorithm: %s' % repr(self.book_header.compression_type))
+
+    @staticmethod
+    def _clean_record(text, replace_returns, delete_chars, last):
+        '''
+        Replaces returns if needed and deletes control characters from text; Returns cleaned text and what was held back
+
+        A trailing return is held back to be put in front of the next record since it might be followed by a space.
+        '''
+        held_back = b''
+        if replace_returns:
+            if not last and text.endswith(b'\r'):
+                text, held_back = text[:-1], b'\r'
+            text = text.replace(b'\r ', b'\n\n ')
+        return text.translate(None, delete_chars), held_back
+
+def _unpack_in_worker(huffs, records):
+    '''Decompresses HUFF/CDIC records in a calibre worker process; Decompresses them here if no worker can be started'''
+    try:
+        from calibre.utils.ipc.simple_worker import fork_job, WorkerError
+    except ImportError:
+        fork_job = None
+
+    if fork_job is not None:
+        try:
+            return fork_job(UNPACK_WORKER_SOURCE, 'unpack_records', args=(huffs, records), no_output=True,
+                            module_is_source_code=True)['result']
+        except WorkerError:
+            pass
+
+    unpack = HuffReader(huffs).unpack
+    return [unpack(record) for record in records]
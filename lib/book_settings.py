@@ -5,19 +5,50 @@ import os
 from urllib import urlencode
 from urllib2 import urlparse
 
+from calibre_plugins.xray_creator.lib.task_pool import TaskPool
+from calibre_plugins.xray_creator.lib.disk_cache import get_cache
 from calibre_plugins.xray_creator.lib.exceptions import PageDoesNotExist
 from calibre_plugins.xray_creator.lib.goodreads_parser import GoodreadsParser
 from calibre_plugins.xray_creator.lib.utilities import GOODREADS_URL_PAT, GOODREADS_ASIN_PAT
-from calibre_plugins.xray_creator.lib.utilities import open_url, LIBRARY, BOOK_ID_PAT, AMAZON_ASIN_PAT
+from calibre_plugins.xray_creator.lib.utilities import open_url, LIBRARY, BOOK_ID_PAT
+from calibre_plugins.xray_creator.lib.amazon_search import find_kindle_asin
 
 from calibre.utils.config import JSONConfig
-from calibre.ebooks.BeautifulSoup import BeautifulSoup
+
+# books searched for at the same time; each host's rate limiter still paces the actual requests
+RESOLVE_WORKERS = 8
+
+# searches that found nothing aren't sent again for the same query until this long has passed unless forced
+FAILED_SEARCH_TTL = 7 * 24 * 60 * 60
+FAILED_SEARCH_CACHE_SIZE = 10 * 1024 * 1024
+
+def resolve_book_settings(database, book_ids, connections):
+    '''
+    Creates settings for each book, searching for every missing ASIN and goodreads url at the same time
+
+    ASINs that were found are saved into the books' identifiers with a single database write at the end.
+    '''
+    book_settings_list = [BookSettings(database, book_id, connections, resolve=False) for book_id in book_ids]
+    found_asins = TaskPool(max_workers=RESOLVE_WORKERS).map(lambda book_settings: book_settings.resolve(),
+                                                           book_settings_list)
+
+    new_identifiers = {}
+    for book_settings, found_asin in zip(book_settings_list, found_asins):
+        if found_asin:
+            identifiers = dict(database.field_for('identifiers', book_settings.book_id))
+            identifiers['mobi-asin'] = found_asin
+            new_identifiers[book_settings.book_id] = identifiers
+    if new_identifiers:
+        database.set_field('identifiers', new_identifiers)
+
+    return book_settings_list
 
 class BookSettings(object):
     '''Holds book specific settings'''
 
-    def __init__(self, database, book_id, connections):
+    def __init__(self, database, book_id, connections, resolve=True):
         self._connections = connections
+        self._book_id = book_id
 
         book_path = database.field_for('path', book_id).replace('/', os.sep)
 
@@ -33,20 +64,51 @@ class BookSettings(object):
         self._asin = self._prefs['asin'] if self._prefs['asin'] != '' else None
         self._goodreads_url = self._prefs['goodreads_url']
 
+        # use identifiers calibre already has before searching for anything
+        identifiers = database.field_for('identifiers', book_id)
+        self._isbn = identifiers.get('isbn')
         if not self._asin:
-            identifiers = database.field_for('identifiers', book_id)
-            if 'mobi-asin' in identifiers.keys():
-                self._asin = database.field_for('identifiers', book_id)['mobi-asin'].decode('ascii')
-                self._prefs['asin'] = self._asin
-            else:
-                self._asin = self.search_for_asin_on_amazon(self.title_and_author)
-                if self._asin:
-                    metadata = database.get_metadata(book_id)
-                    identifiers = metadata.get_identifiers()
-                    identifiers['mobi-asin'] = self._asin
-                    metadata.set_identifiers(identifiers)
-                    database.set_metadata(book_id, metadata)
+            for identifier in ('mobi-asin', 'amazon'):
+                if identifiers.has_key(identifier):
+                    self._asin = identifiers[identifier].decode('ascii')
                     self._prefs['asin'] = self._asin
+                    break
+        if self._goodreads_url == '' and identifiers.has_key('goodreads'):
+            self._goodreads_url = 'https://www.goodreads.com/book/show/{0}'.format(identifiers['goodreads'])
+            self._prefs['goodreads_url'] = self._goodreads_url
+
+        self._aliases = self._prefs['aliases']
+
+        if resolve:
+            found_asin = self.resolve()
+            if found_asin:
+                metadata = database.get_metadata(book_id)
+                identifiers = metadata.get_identifiers()
+                identifiers['mobi-asin'] = found_asin
+                metadata.set_identifiers(identifiers)
+                database.set_metadata(book_id, metadata)
+
+    def resolve(self):
+        '''
+        Searches for book's ASIN and goodreads url if they aren't set yet
+
+        Direct lookups by ISBN and goodreads url are tried before searching by title and author. Doesn't touch the
+        calibre database so it can run in a worker thread; Returns the ASIN if one was found so the caller can save it
+        into the book's identifiers.
+        '''
+        found_asin = None
+        if self._goodreads_url == '' and self._isbn:
+            url = self.search_for_goodreads_url_by_isbn(self._isbn)
+            if url:
+                self._goodreads_url = url
+                self._prefs['goodreads_url'] = self._goodreads_url
+
+        if not self._asin and self._goodreads_url != '':
+            self._asin = found_asin = self.search_for_asin_on_goodreads(self._goodreads_url)
+        if not self._asin:
+            self._asin = found_asin = self.search_for_asin_on_amazon(self.title_and_author)
+        if self._asin:
+            self._prefs['asin'] = self._asin
 
         if self._goodreads_url == '':
             url = None
@@ -59,18 +121,16 @@ class BookSettings(object):
                 self._goodreads_url = url
                 self._prefs['goodreads_url'] = self._goodreads_url
                 if not self._asin:
-                    self._asin = self.search_for_asin_on_goodreads(self._goodreads_url)
+                    self._asin = found_asin = self.search_for_asin_on_goodreads(self._goodreads_url)
                     if self._asin:
-                        metadata = database.get_metadata(book_id)
-                        identifiers = metadata.get_identifiers()
-                        identifiers['mobi-asin'] = self._asin
-                        metadata.set_identifiers(identifiers)
-                        database.set_metadata(book_id, metadata)
                         self._prefs['asin'] = self._asin
 
-        self._aliases = self._prefs['aliases']
-
         self.save()
+        return found_asin
+
+    @property
+    def book_id(self):
+        return self._book_id
 
     @property
     def prefs(self):
@@ -126,12 +186,48 @@ class BookSettings(object):
         self._prefs['goodreads_url'] = self._goodreads_url
         self._prefs['aliases'] = self._aliases
 
-    def search_for_asin_on_amazon(self, query):
+    @staticmethod
+    def _search(name, query, search, force):
+        '''
+        Returns search(query, force) unless the same search found nothing recently; Searches that find nothing are remembered
+
+        Forced searches also skip the http cache so the server is really asked again.
+        '''
+        failed_searches = get_cache('failed_searches', FAILED_SEARCH_CACHE_SIZE)
+        key = u'{0} {1}'.format(name, query)
+        entry = failed_searches.get(key)
+        if not force and entry and entry[2] < FAILED_SEARCH_TTL:
+            return None
+
+        result = search(query, force)
+        if result is None:
+            failed_searches.set(key, '')
+        elif entry:
+            failed_searches.delete(key)
+        return result
+
+    def search_for_asin_on_amazon(self, query, force=False):
+        '''Search for book's asin on amazon using given query; force searches even if it found nothing recently'''
+        return self._search('amazon_asin', query, self._read_amazon_search, force)
+
+    def search_for_goodreads_url(self, keywords, force=False):
+        '''Searches for book's goodreads url using given keywords; force searches even if it found nothing recently'''
+        return self._search('goodreads_url', keywords, self._read_goodreads_search, force)
+
+    def search_for_asin_on_goodreads(self, url, force=False):
+        '''Searches for ASIN of book at given url; force searches even if it found nothing recently'''
+        return self._search('goodreads_asin', url, self._read_goodreads_asin, force)
+
+    def search_for_goodreads_url_by_isbn(self, isbn, force=False):
+        '''Looks up book's goodreads url using its ISBN; force looks it up even if it found nothing recently'''
+        return self._search('goodreads_isbn', isbn, self._read_goodreads_isbn, force)
+
+    def _read_amazon_search(self, query, force=False):
         '''Search for book's asin on amazon using given query'''
         query = urlencode({'keywords': query})
         url = '/s/ref=sr_qz_back?sf=qz&rh=i%3Adigital-text%2Cn%3A154606011%2Ck%3A' + query[9:] + '&' + query
         try:
-            response = open_url(self._connections['amazon'], url)
+            response = open_url(self._connections['amazon'], url, force=force)
         except PageDoesNotExist:
             return None
 
@@ -140,25 +236,13 @@ class BookSettings(object):
                 and not 'so we searched in All Departments' in response):
             return None
 
-        soup = BeautifulSoup(response)
-        results = soup.findAll('div', {'id': 'resultsCol'})
+        return find_kindle_asin(response)
 
-        if not results or len(results) == 0:
-            return None
-
-        for result in results:
-            if 'Buy now with 1-Click' in str(result):
-                asin_search = AMAZON_ASIN_PAT.search(str(result))
-                if asin_search:
-                    return asin_search.group(1)
-
-        return None
-
-    def search_for_goodreads_url(self, keywords):
+    def _read_goodreads_search(self, keywords, force=False):
         '''Searches for book's goodreads url using given keywords'''
         query = urlencode({'q': keywords})
         try:
-            response = open_url(self._connections['goodreads'], '/search?' + query)
+            response = open_url(self._connections['goodreads'], '/search?' + query, force=force)
         except PageDoesNotExist:
             return None
 
@@ -174,7 +258,19 @@ class BookSettings(object):
         url = 'https://www.goodreads.com' + urlsearch.group(1)
         return urlparse.urlparse(url)._replace(query=None).geturl()
 
-    def search_for_asin_on_goodreads(self, url):
+    def _read_goodreads_isbn(self, isbn, force=False):
+        '''Looks up book's goodreads url using its ISBN; goodreads redirects ISBNs it knows to the book's page'''
+        location = open_url(self._connections['goodreads'], '/book/isbn/' + isbn, return_redirect_url=True, force=force)
+        if not location:
+            return None
+
+        # a redirect anywhere but a book page means goodreads doesn't know the ISBN
+        url = urlparse.urljoin('https://www.goodreads.com', location)
+        if not url.startswith('https://www.goodreads.com/book/show/'):
+            return None
+        return urlparse.urlparse(url)._replace(query=None).geturl()
+
+    def _read_goodreads_asin(self, url, force=False):
         '''Searches for ASIN of book at given url'''
         book_id_search = BOOK_ID_PAT.search(url)
         if not book_id_search:
@@ -183,7 +279,7 @@ class BookSettings(object):
         book_id = book_id_search.group(1)
 
         try:
-            response = open_url(self._connections['goodreads'], '/buttons/glide/' + book_id)
+            response = open_url(self._connections['goodreads'], '/buttons/glide/' + book_id, force=force)
         except PageDoesNotExist:
             return None
 
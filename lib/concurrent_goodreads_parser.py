@@ -0,0 +1,55 @@
+# concurrent_goodreads_parser.py
+'''Parses goodreads data like GoodreadsParser but fetches independent pages at the same time'''
+
+from calibre_plugins.xray_creator.lib.goodreads_parser import GoodreadsParser
+
+class ConcurrentGoodreadsParser(GoodreadsParser):
+    '''
+    Parses Goodreads page for x-ray, author profile, start actions, and end actions as needed
+
+    Once the book page has been read, the x-ray pages (characters, settings, quotes) and the non-xray pages
+    (author pages, author image, tooltips) are fetched on the task pool at the same time. The pool can be shared
+    by every book in a job; if it was created with the job's abort event, tasks that haven't started yet when the
+    job is aborted raise JobAborted instead of running.
+    '''
+
+    def parse(self, create_xray=False, create_author_profile=False, create_start_actions=False, create_end_actions=False):
+        '''Parses goodreads for x-ray, author profile, start actions, and end actions depending on user settings'''
+        if self._page_source is None:
+            return
+
+        xray_task = self._task_pool.submit(self._get_xray) if create_xray else None
+        non_xray_results = self._get_non_xray(create_author_profile, create_start_actions, create_end_actions)
+        compiled_xray = xray_task.result() if xray_task else None
+        compiled_author_profile, compiled_start_actions, compiled_end_actions = non_xray_results
+
+        return compiled_xray, compiled_author_profile, compiled_start_actions, compiled_end_actions
+
+    def _get_xray(self):
+        '''Gets x-ray data from goodreads and creates x-ray dict'''
+        characters_task = self._task_pool.submit(self.get_characters, 1)
+        settings_task = self._task_pool.submit(self.get_settings, 1)
+        quotes_task = self._task_pool.submit(self._get_quotes)
+
+        # settings were numbered from 1 since we didn't know how many characters there would be;
+        # shift them so they come right after the characters like they do when fetched in order
+        characters = characters_task.result()
+        settings = dict((entity_id + len(characters), setting)
+                        for entity_id, setting in settings_task.result().items())
+        return self._compile_xray(characters, settings, quotes_task.result())
+
+    def _fetch_author_data(self, author_info, read_secondary_authors):
+        '''Starts reading author pages on the task pool; Returns function that waits for them'''
+        tasks = [self._task_pool.submit(self._read_primary_author_and_other_books, author_info)]
+        if read_secondary_authors:
+            tasks.append(self._task_pool.submit(self._read_secondary_author_pages, author_info))
+        return lambda: [task.result() for task in tasks]
+
+    def _fetch_customer_recommendations(self):
+        '''Starts getting customer recommendations on the task pool; Returns function that waits for them'''
+        return self._task_pool.submit(self._get_customer_recommendations).result
+
+    def _read_primary_author_and_other_books(self, author_info):
+        '''Reads primary author's page then gets the author's other books from it'''
+        self._read_primary_author_page(author_info)
+        self._get_author_other_books(author_info)
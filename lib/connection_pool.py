@@ -0,0 +1,168 @@
+# connection_pool.py
+'''Thread-safe pool of keep-alive connections used for all http requests'''
+
+import zlib
+import errno
+import socket
+import threading
+from httplib import HTTPSConnection, HTTPException, BadStatusLine
+
+from calibre_plugins.xray_creator.lib.rate_limiter import RateLimiter
+
+# how a request fails on a keep-alive connection the server already closed
+STALE_CONNECTION_ERRNOS = (errno.ECONNRESET, errno.EPIPE, errno.ECONNABORTED)
+
+class Response(object):
+    '''Holds the fully read status, headers, and body of an http response'''
+    def __init__(self, status, headers, body):
+        self._status = status
+        self._headers = headers
+        self._body = body
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def body(self):
+        return self._body
+
+class ConnectionPool(object):
+    '''Hands out keep-alive connections to a single host; At most max_connections are open at once'''
+    def __init__(self, host, proxy=None, max_connections=4, timeout=30):
+        self._host = host
+        self._proxy = proxy
+        self._timeout = timeout
+        self._idle_connections = []
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(max_connections)
+        self._rate_limiter = RateLimiter()
+        self._bytes_received = 0
+        self._bytes_decoded = 0
+
+    @property
+    def host(self):
+        return self._host
+
+    @property
+    def rate_limiter(self):
+        return self._rate_limiter
+
+    @property
+    def bytes_received(self):
+        return self._bytes_received
+
+    @property
+    def bytes_decoded(self):
+        return self._bytes_decoded
+
+    def _new_connection(self):
+        '''Creates a connection to host, tunneling through the https proxy if there is one'''
+        if self._proxy:
+            proxy_address, proxy_port = self._proxy
+            connection = HTTPSConnection(proxy_address, proxy_port, timeout=self._timeout)
+            connection.set_tunnel(self._host, 443)
+        else:
+            connection = HTTPSConnection(self._host, timeout=self._timeout)
+        return connection
+
+    def _acquire(self, fresh=False):
+        '''
+        Waits for a free slot then reuses an idle connection or opens a new one; Returns it and whether it was reused
+
+        fresh always opens a new connection.
+        '''
+        self._available.acquire()
+        with self._lock:
+            if self._idle_connections and not fresh:
+                return self._idle_connections.pop(), True
+        try:
+            return self._new_connection(), False
+        except Exception:
+            self._available.release()
+            raise
+
+    def _release(self, connection, reuse=True):
+        '''Returns connection to the pool; Closes it instead if it can't be reused'''
+        if reuse:
+            with self._lock:
+                self._idle_connections.append(connection)
+        else:
+            connection.close()
+        self._available.release()
+
+    def request(self, method, url, headers):
+        '''Sends request on a pooled connection and returns the fully read response with its body decompressed'''
+        headers = dict(headers)
+        headers['Accept-Encoding'] = 'gzip, deflate'
+
+        connection, reused = self._acquire()
+        try:
+            status, response_headers, body = self._send(connection, method, url, headers)
+        except (BadStatusLine, socket.error) as exception:
+            if not reused or not self._is_stale_connection_error(exception):
+                raise
+            # the server closed the connection while it sat idle, which says nothing about the host, so try again
+            # right away on a new connection instead of letting the caller back off
+            connection, _ = self._acquire(fresh=True)
+            status, response_headers, body = self._send(connection, method, url, headers)
+
+        encoded_size = len(body)
+        try:
+            body = self._decode(body, response_headers.pop('content-encoding', None))
+        except zlib.error as exception:
+            # a truncated or mislabelled body is treated like any other failed request so it gets retried
+            raise HTTPException('Unable to decode response body: {0}'.format(exception))
+        with self._lock:
+            self._bytes_received += encoded_size
+            self._bytes_decoded += len(body)
+
+        return Response(status, response_headers, body)
+
+    def _send(self, connection, method, url, headers):
+        '''Sends request on connection and returns the fully read status, headers, and body'''
+        # the slot is given back whatever goes wrong; only a connection that finished its response is reused
+        reuse = False
+        try:
+            connection.request(method, url, headers=headers)
+            response = connection.getresponse()
+            response_headers = dict(response.getheaders())
+            body = response.read()
+            reuse = not response.will_close
+        finally:
+            self._release(connection, reuse=reuse)
+        return response.status, response_headers, body
+
+    @staticmethod
+    def _is_stale_connection_error(exception):
+        '''Whether exception is how a request fails on a connection the server closed; Timeouts aren't'''
+        if isinstance(exception, BadStatusLine):
+            return True
+        return not isinstance(exception, socket.timeout) and exception.errno in STALE_CONNECTION_ERRNOS
+
+    @staticmethod
+    def _decode(body, content_encoding):
+        '''Decompresses body according to the response's content encoding'''
+        if not body or not content_encoding:
+            return body
+        content_encoding = content_encoding.strip().lower()
+        if content_encoding == 'gzip':
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        if content_encoding == 'deflate':
+            # some servers send raw deflate data instead of the zlib stream the spec asks for
+            try:
+                return zlib.decompress(body)
+            except zlib.error:
+                return zlib.decompress(body, -zlib.MAX_WBITS)
+        return body
+
+    def close(self):
+        '''Closes all idle connections'''
+        with self._lock:
+            for connection in self._idle_connections:
+                connection.close()
+            self._idle_connections = []
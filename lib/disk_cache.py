@@ -0,0 +1,150 @@
+# disk_cache.py
+'''Persistent key/value stores kept in the plugin's cache directory'''
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+
+from calibre.utils.config import config_dir
+
+from calibre_plugins.xray_creator.lib.transport import get_transport
+
+CACHE_DIRECTORY = os.path.join(config_dir, 'plugins', 'xray_creator_cache')
+
+# hits only record their access time if the stored one is older than this so most hits don't write to disk;
+# eviction order only needs to be roughly right
+ACCESS_UPDATE_INTERVAL = 60 * 60
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+def get_cache(name, max_size):
+    '''
+    Returns the shared cache called name, opening it the first time it's asked for
+
+    Every persistent store goes through here so none of them answer for the network while a transport that
+    shouldn't use caches (recording or replaying) is in use; NullCache is returned instead.
+    '''
+    if not get_transport().use_cache:
+        return NullCache()
+    with _CACHES_LOCK:
+        if not _CACHES.has_key(name):
+            _CACHES[name] = DiskCache(os.path.join(CACHE_DIRECTORY, '{0}.sqlite'.format(name)), max_size)
+        return _CACHES[name]
+
+class NullCache(object):
+    '''Cache that never has anything in it and drops everything stored in it'''
+    @staticmethod
+    def get(key):
+        return None
+
+    @staticmethod
+    def set(key, value, metadata=None):
+        pass
+
+    @staticmethod
+    def set_compressed(key, compressed, metadata=None):
+        pass
+
+    @staticmethod
+    def touch(key, metadata=None):
+        pass
+
+    @staticmethod
+    def delete(key):
+        pass
+
+class DiskCache(object):
+    '''
+    Thread-safe key/value store backed by a sqlite file
+
+    Values are stored compressed along with a dict of metadata. Once the total size of the stored values goes
+    over max_size, the least recently used entries are evicted.
+    '''
+    def __init__(self, filename, max_size):
+        if not os.path.exists(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        self._connection.text_factory = str
+        self._cursor = self._connection.cursor()
+        self._cursor.execute('CREATE TABLE IF NOT EXISTS entry(key TEXT, value BLOB, metadata TEXT, size INTEGER, '
+                             'stored REAL, accessed REAL, PRIMARY KEY(key))')
+        self._cursor.execute('CREATE INDEX IF NOT EXISTS entry_accessed ON entry(accessed)')
+        self._connection.commit()
+        self._cursor.execute('SELECT TOTAL(size) FROM entry')
+        self._total_size = self._cursor.fetchone()[0]
+
+    def get(self, key):
+        '''Returns value, metadata, and age in seconds of key's entry; Returns None if there is no entry'''
+        with self._lock:
+            self._cursor.execute('SELECT value, metadata, stored, accessed FROM entry WHERE key = ?', (key,))
+            row = self._cursor.fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[3] > ACCESS_UPDATE_INTERVAL:
+                self._cursor.execute('UPDATE entry SET accessed = ? WHERE key = ?', (now, key))
+                self._connection.commit()
+
+        value, metadata, stored, _ = row
+        return zlib.decompress(value), json.loads(metadata), time.time() - stored
+
+    def set(self, key, value, metadata=None):
+        '''Stores value and metadata under key then evicts old entries if the cache is too big'''
+        self.set_compressed(key, zlib.compress(value), metadata)
+
+    def set_compressed(self, key, compressed, metadata=None):
+        '''Same as set but takes a value that's already been zlib compressed'''
+        now = time.time()
+        with self._lock:
+            self._total_size -= self._size(key)
+            self._cursor.execute('INSERT OR REPLACE INTO entry VALUES (?, ?, ?, ?, ?, ?)',
+                                 (key, sqlite3.Binary(compressed), json.dumps(metadata or {}), len(compressed),
+                                  now, now))
+            self._total_size += len(compressed)
+            self._evict()
+            self._connection.commit()
+
+    def touch(self, key, metadata=None):
+        '''Marks key's entry as freshly stored without rewriting its value; Replaces metadata if given'''
+        now = time.time()
+        with self._lock:
+            if metadata is None:
+                self._cursor.execute('UPDATE entry SET stored = ?, accessed = ? WHERE key = ?', (now, now, key))
+            else:
+                self._cursor.execute('UPDATE entry SET stored = ?, accessed = ?, metadata = ? WHERE key = ?',
+                                     (now, now, json.dumps(metadata), key))
+            self._connection.commit()
+
+    def delete(self, key):
+        '''Removes key's entry if there is one'''
+        with self._lock:
+            self._total_size -= self._size(key)
+            self._cursor.execute('DELETE FROM entry WHERE key = ?', (key,))
+            self._connection.commit()
+
+    def _size(self, key):
+        '''Returns size of key's stored value; Returns 0 if there is no entry'''
+        self._cursor.execute('SELECT size FROM entry WHERE key = ?', (key,))
+        row = self._cursor.fetchone()
+        return row[0] if row else 0
+
+    def _evict(self):
+        '''Removes least recently used entries until the total size is under max size'''
+        if self._total_size <= self._max_size:
+            return
+
+        self._cursor.execute('SELECT key, size FROM entry ORDER BY accessed')
+        evicted = []
+        for key, size in self._cursor.fetchall():
+            if self._total_size <= self._max_size:
+                break
+            evicted.append((key,))
+            self._total_size -= size
+        self._cursor.executemany('DELETE FROM entry WHERE key = ?', evicted)
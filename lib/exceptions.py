@@ -4,3 +4,7 @@
 class PageDoesNotExist(Exception):
     '''Exception for when page does not exist'''
     pass
+
+class JobAborted(Exception):
+    '''Exception for when a task is skipped because the user aborted the job'''
+    pass
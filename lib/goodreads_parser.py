@@ -3,15 +3,75 @@
 
 import re
 import json
-import base64
 import zipfile
 import datetime
 import urlparse
-from urllib2 import urlopen
 from lxml import html
 
 from calibre_plugins.xray_creator.config import __prefs__ as prefs
-from calibre_plugins.xray_creator.lib.utilities import open_url, BOOK_ID_PAT, GOODREADS_ASIN_PAT
+from calibre_plugins.xray_creator.lib.task_pool import TaskPool
+from calibre_plugins.xray_creator.lib.page_cache import PageCache
+from calibre_plugins.xray_creator.lib.disk_cache import get_cache
+from calibre_plugins.xray_creator.lib.html_parser import MAIN_CONTENT, LEFT_CONTAINER
+from calibre_plugins.xray_creator.lib.image_store import ImageStore
+from calibre_plugins.xray_creator.lib.page_extractor import PageSpec
+from calibre_plugins.xray_creator.lib.utilities import BOOK_ID_PAT, GOODREADS_ASIN_PAT
+
+TOOLTIP_CHUNK_SIZE = 20
+TOOLTIP_TTL = 7 * 24 * 60 * 60
+TOOLTIP_CACHE_SIZE = 50 * 1024 * 1024
+
+# parsed character and setting pages; shared by every book that links to them
+ENTITY_TTL = 30 * 24 * 60 * 60
+ENTITY_CACHE_SIZE = 50 * 1024 * 1024
+
+# bios, image urls, and other books of authors; how long they are kept is set by the author_cache_days pref
+AUTHOR_CACHE_SIZE = 50 * 1024 * 1024
+
+# everything read from goodreads pages; fields are scoped to the smallest container that holds them
+BOOK_PAGE = PageSpec(
+    containers={'book_data_box': '//div[@id="bookDataBox"]',
+                'book_authors': '//div[@id="bookAuthors"]',
+                'book_carousel': '//div[@class="bookCarousel"]',
+                'main_content': '//div[contains(concat(" ", @class, " "), " mainContent ")]'},
+    fields={'characters': ('book_data_box', './/div[@class="clearFloats" and contains(., "Characters")]'
+                                            '//div[@class="infoBoxRowItem"]//a'),
+            'settings': ('book_data_box', './div[@class="infoBoxRowItem"]/a[contains(@href, "/places/")]'),
+            'quotes_link': (None, '//a[@class="actionLink" and contains(., "More quotes")]'),
+            'quotes': (None, '//div[@class=" clearFloats bigBox" and contains(., "Quotes from")]'
+                             '//div[@class="bigBoxContent containerWithHeaderContent"]//span[@class="readable"]'),
+            'authors': ('book_authors', './span[@itemprop="author"]//a'),
+            'customer_recommendations': ('book_carousel', './div[@class="carouselRow"]/ul/li/a'),
+            'image': ('main_content', './/div[@id="imagecol"]//img[@id="coverImage"]'),
+            'num_pages': (None, '//span[@itemprop="numberOfPages"]')})
+CHARACTER_PAGE = PageSpec(
+    containers={},
+    fields={'description': (None, '//div[@class="workCharacterAboutClear"]/text()'),
+            'aliases': (None, '//div[@class="grey500BoxContent" and contains(.,"aliases")]/text()')})
+SETTING_PAGE = PageSpec(
+    containers={},
+    fields={'description': (None, '//div[@class="mainContentContainer "]/div[@class="mainContent"]'
+                                  '/div[@class="mainContentFloat"]/div[@class="leftContainer"]/span/text()')})
+QUOTES_PAGE = PageSpec(
+    containers={},
+    fields={'quotes': (None, '//div[@class="quoteText"]')})
+AUTHOR_PAGE = PageSpec(
+    containers={},
+    fields={'bio': (None, '//div[@class="aboutAuthorInfo"]/span'),
+            'image': (None, '//a[contains(@href, "/photo/author/")]/img'),
+            'books': (None, '//tr[@itemtype="http://schema.org/Book"]')})
+TOOLTIP = PageSpec(
+    containers={},
+    fields={'title': (None, '//a[contains(@class, "readable")]'),
+            'authors': (None, '//a[contains(@class, "authorName")]'),
+            'rating': (None, '//div[@class="bookRatingAndPublishing"]/span[@class="minirating"]'),
+            'asin_links': (None, '//a[contains(@class, "kindlePreviewButtonIcon")]/@href'),
+            'description': (None, '//div[@class="addBookTipDescription"]//span[not(contains(@id, "freeTextContainer"))]'),
+            'description_backup': (None, '//div[@class="addBookTipDescription"]//span[contains(@id, "freeTextContainer")]')})
+
+# every kind of page read, by the name its extraction times are logged under
+PAGE_SPECS = {'Book pages': BOOK_PAGE, 'Character pages': CHARACTER_PAGE, 'Setting pages': SETTING_PAGE,
+              'Quotes pages': QUOTES_PAGE, 'Author pages': AUTHOR_PAGE, 'Tooltips': TOOLTIP}
 
 class GoodreadsParser(object):
     '''Parses Goodreads page for x-ray, author profile, start actions, and end actions as needed'''
@@ -33,18 +93,19 @@ class GoodreadsParser(object):
 
     COMMON_WORDS = 'the of de'.split()
 
-    def __init__(self, url, connection, asin):
+    def __init__(self, url, connection, asin, task_pool=None, page_cache=None):
         self._connection = connection
         self._asin = asin
+        self._task_pool = task_pool if task_pool else TaskPool()
+        self._page_cache = page_cache if page_cache else PageCache()
 
         book_id_search = BOOK_ID_PAT.search(url)
         self._goodreads_book_id = book_id_search.group(1) if book_id_search else None
 
-        response = open_url(self._connection, url)
-        self._page_source = None
-        if not response:
+        self._page_source = self._page_cache.open_html(self._connection, url, MAIN_CONTENT)
+        if self._page_source is None:
             return
-        self._page_source = html.fromstring(response)
+        self._book_page = BOOK_PAGE.extract(self._page_source)
 
         self._author_recommendations = None
         self._author_other_books = []
@@ -78,10 +139,12 @@ class GoodreadsParser(object):
 
         author_info = self._get_author_info()
         if len(author_info) == 0:
-            return
-        self._read_primary_author_page(author_info)
-        self._get_author_other_books(author_info)
+            return compiled_author_profile, compiled_start_actions, compiled_end_actions
 
+        wait_for_authors = self._fetch_author_data(author_info, create_start_actions or create_end_actions)
+        get_cust_recommendations = self._fetch_customer_recommendations() if create_end_actions else None
+
+        wait_for_authors()
         if create_author_profile:
             compiled_author_profile = self._compile_author_profile(author_info)
 
@@ -89,7 +152,6 @@ class GoodreadsParser(object):
             with zipfile.ZipFile(prefs['plugin_path'], 'r') as template_file:
                 goodreads_templates = json.loads(template_file.read('templates/goodreads_data_template.json'))
 
-            self._read_secondary_author_pages(author_info)
             book_image_url = self._get_book_image_url()
 
             if create_start_actions:
@@ -98,12 +160,28 @@ class GoodreadsParser(object):
                                                                      reading_info, book_image_url)
 
             if create_end_actions:
-                cust_recommendations = self._get_customer_recommendations()
                 compiled_end_actions = self._compile_end_actions(goodreads_templates['BASE_END_ACTIONS'], author_info,
-                                                                 cust_recommendations, book_image_url)
+                                                                 get_cust_recommendations(), book_image_url)
 
         return compiled_author_profile, compiled_start_actions, compiled_end_actions
 
+    def _fetch_author_data(self, author_info, read_secondary_authors):
+        '''
+        Reads author pages and the primary author's other books into author_info; Returns function that waits for them
+
+        Subclasses can start the reads here and have the returned function wait for them to finish.
+        '''
+        self._read_primary_author_page(author_info)
+        self._get_author_other_books(author_info)
+        if read_secondary_authors:
+            self._read_secondary_author_pages(author_info)
+        return lambda: None
+
+    def _fetch_customer_recommendations(self):
+        '''Gets customer recommendations; Returns function that returns them, like _fetch_author_data'''
+        cust_recommendations = self._get_customer_recommendations()
+        return lambda: cust_recommendations
+
     @staticmethod
     def _compile_xray(characters, settings, quotes):
         '''Compiles x-ray data into dict'''
@@ -186,28 +264,16 @@ class GoodreadsParser(object):
         if self._page_source is None:
             return
 
-        characters = self._page_source.xpath('//div[@class="clearFloats" and contains(., "Characters")]//div[@class="infoBoxRowItem"]//a')
-        character_data = {}
-        for char in characters:
-            if '/characters/' not in char.get('href'):
-                continue
-            resp = open_url(self._connection, char.get('href'))
-
-            if not resp:
-                continue
+        characters = [char for char in self._book_page['characters'] if '/characters/' in char.get('href')]
 
-            char_page = html.fromstring(resp)
+        # fetch all character pages concurrently but assign entity ids in page order so they stay the same
+        character_pages = self._task_pool.map(lambda url: self._get_entity(url, self._read_character_page),
+                                              [char.get('href') for char in characters])
+        character_data = {}
+        for char, char_page in zip(characters, character_pages):
             if char_page is None:
                 continue
-
-            desc = char_page.xpath('//div[@class="workCharacterAboutClear"]/text()')
-            if len(desc) > 0 and re.sub(r'\s+', ' ', desc[0]).strip():
-                desc = unicode(re.sub(r'\s+', ' ', desc[0]).strip().decode('utf-8').encode('latin-1'))
-            else:
-                desc = u'No description found on Goodreads.'
-            alias_list = char_page.xpath('//div[@class="grey500BoxContent" and contains(.,"aliases")]/text()')
-            alias_list = [re.sub(r'\s+', ' ', x).strip() for aliases in alias_list for x in aliases.split(',')
-                          if re.sub(r'\s+', ' ', x).strip()]
+            desc, alias_list = char_page
             character_data[entity_id] = {'label': unicode(char.text.decode('utf-8').encode('latin-1')),
                                          'description': desc,
                                          'aliases': alias_list}
@@ -305,53 +371,83 @@ class GoodreadsParser(object):
             pass
         return aliases
 
+    @staticmethod
+    def _get_entity(url, read_page):
+        '''Returns parsed character or setting page at url; The page is only read if it isn't cached or is stale'''
+        entity_cache = get_cache('goodreads_entities', ENTITY_CACHE_SIZE)
+        key = urlparse.urlsplit(url).path
+        entry = entity_cache.get(key)
+        if entry and entry[2] < ENTITY_TTL:
+            return json.loads(entry[0])
+
+        record = read_page(url)
+        if record is not None:
+            entity_cache.set(key, json.dumps(record))
+        return record
+
+    def _read_character_page(self, url):
+        '''Reads character's page and gets his/her description and aliases'''
+        char_page = self._page_cache.open_html(self._connection, url, MAIN_CONTENT)
+        if char_page is None:
+            return None
+
+        fields = CHARACTER_PAGE.extract(char_page)
+        desc = fields['description']
+        if len(desc) > 0 and re.sub(r'\s+', ' ', desc[0]).strip():
+            desc = unicode(re.sub(r'\s+', ' ', desc[0]).strip().decode('utf-8').encode('latin-1'))
+        else:
+            desc = u'No description found on Goodreads.'
+        alias_list = [re.sub(r'\s+', ' ', x).strip() for aliases in fields['aliases'] for x in aliases.split(',')
+                      if re.sub(r'\s+', ' ', x).strip()]
+        return desc, alias_list
+
     def get_settings(self, entity_id):
         '''Gets book's setting data'''
         if self._page_source is None:
             return
 
-        settings = self._page_source.xpath('//div[@id="bookDataBox"]/div[@class="infoBoxRowItem"]/a[contains(@href, "/places/")]')
+        settings = [setting for setting in self._book_page['settings'] if '/places/' in setting.get('href')]
+
+        # fetch all setting pages concurrently but assign entity ids in page order so they stay the same
+        setting_descs = self._task_pool.map(lambda url: self._get_entity(url, self._read_setting_page),
+                                            [setting.get('href') for setting in settings])
         settings_data = {}
-        for setting in settings:
-            if '/places/' not in setting.get('href'):
-                continue
-            label = setting.text
-            resp = open_url(self._connection, setting.get('href'))
-            if not resp:
-                continue
-            setting_page = html.fromstring(resp)
-            if setting_page is None:
+        for setting, desc in zip(settings, setting_descs):
+            if desc is None:
                 continue
-            desc = setting_page.xpath('//div[@class="mainContentContainer "]/div[@class="mainContent"]/div[@class="mainContentFloat"]/div[@class="leftContainer"]/span/text()')
-            if len(desc) > 0 and re.sub(r'\s+', ' ', desc[0]).strip():
-                desc = unicode(re.sub(r'\s+', ' ', desc[0]).strip().decode('utf-8').encode('latin-1'))
-            else:
-                desc = u'No description found on Goodreads.'
-            settings_data[entity_id] = {'label': unicode(label.decode('utf-8').encode('latin-1')),
+            settings_data[entity_id] = {'label': unicode(setting.text.decode('utf-8').encode('latin-1')),
                                         'description': desc,
                                         'aliases': []}
             entity_id += 1
 
         return settings_data
 
+    def _read_setting_page(self, url):
+        '''Reads setting's page and gets its description'''
+        setting_page = self._page_cache.open_html(self._connection, url, LEFT_CONTAINER)
+        if setting_page is None:
+            return None
+
+        desc = SETTING_PAGE.extract(setting_page)['description']
+        if len(desc) > 0 and re.sub(r'\s+', ' ', desc[0]).strip():
+            return unicode(re.sub(r'\s+', ' ', desc[0]).strip().decode('utf-8').encode('latin-1'))
+        return u'No description found on Goodreads.'
+
     def _get_quotes(self):
         '''Gets book's quote data'''
         if self._page_source is None:
             return
 
-        quotes_page = self._page_source.xpath('//a[@class="actionLink" and contains(., "More quotes")]')
+        quotes_page = self._book_page['quotes_link']
         quotes = []
         if len(quotes_page) > 0:
-            resp = open_url(self._connection, quotes_page[0].get('href'))
-            if not resp:
-                return
-            quotes_page = html.fromstring(resp)
+            quotes_page = self._page_cache.open_html(self._connection, quotes_page[0].get('href'), LEFT_CONTAINER)
             if quotes_page is None:
                 return
-            for quote in quotes_page.xpath('//div[@class="quoteText"]'):
+            for quote in QUOTES_PAGE.extract(quotes_page)['quotes']:
                 quotes.append(re.sub(r'\s+', ' ', quote.text).strip().decode('ascii', 'ignore'))
         else:
-            for quote in self._page_source.xpath('//div[@class=" clearFloats bigBox" and contains(., "Quotes from")]//div[@class="bigBoxContent containerWithHeaderContent"]//span[@class="readable"]'):
+            for quote in self._book_page['quotes']:
                 quotes.append(re.sub(r'\s+', ' ', quote.text).strip().decode('ascii', 'ignore'))
 
         return quotes
@@ -362,7 +458,7 @@ class GoodreadsParser(object):
         if self._page_source is None:
             return
 
-        for author in self._page_source.xpath('//div[@id="bookAuthors"]/span[@itemprop="author"]//a'):
+        for author in self._book_page['authors']:
             author_name = author.find('span[@itemprop="name"]').text.strip()
             author_page = author.get('href')
             if author_name and author_page:
@@ -370,26 +466,46 @@ class GoodreadsParser(object):
         return author_info
 
     def _read_primary_author_page(self, author_info):
-        '''Rreads primary author's page and gets his/her bio, image url, and image encoded into base64'''
+        '''Rreads primary author's data and gets his/her image encoded into base64'''
         author = author_info[0]
-        author['page'] = html.fromstring(open_url(self._connection, author['url']))
-        author['bio'] = self._get_author_bio(author['page'])
-        author['image_url'], author['encoded_image'] = self._get_author_image(author['page'], encode_image=True)
+        self._read_author(author, read_other_books=True)
+        author['encoded_image'] = None
+        if author['image_url']:
+            # the image store keeps the encoded image on disk so books by the same author share it across runs
+            author['encoded_image'] = self._page_cache.get(('encoded_image', author['image_url']),
+                                                           ImageStore().get_encoded_image, author['image_url'])
 
     def _read_secondary_author_pages(self, author_info):
-        '''Reads secondary authors' page and gets their bios, image urls, and images encoded into base64'''
+        '''Reads secondary authors' data'''
         if len(author_info) < 2:
             return
 
         for author in author_info[1:]:
-            author['page'] = html.fromstring(open_url(self._connection, author['url']))
-            author['bio'] = self._get_author_bio(author['page'])
-            author['image_url'] = self._get_author_image(author['page'])
+            self._read_author(author)
+
+    def _read_author(self, author, read_other_books=False):
+        '''Gets author's bio, image url, and optionally other books; The author's page is only read if they aren't cached'''
+        author_cache = get_cache('goodreads_authors', AUTHOR_CACHE_SIZE)
+        key = urlparse.urlsplit(author['url']).path
+        entry = author_cache.get(key)
+        record = None
+        if entry and entry[2] < prefs['author_cache_days'] * 24 * 60 * 60:
+            record = json.loads(entry[0])
+        if record is None or (read_other_books and record['other_books'] is None):
+            author_page = self._page_cache.open_html(self._connection, author['url'], MAIN_CONTENT)
+            record = {'bio': self._get_author_bio(author_page),
+                      'image_url': self._get_author_image(author_page),
+                      'other_books': self._read_author_other_books(author_page) if read_other_books else None}
+            author_cache.set(key, json.dumps(record))
+
+        author['bio'] = record['bio']
+        author['image_url'] = record['image_url']
+        author['other_books'] = record['other_books']
 
     @staticmethod
     def _get_author_bio(author_page):
         '''Gets author's bio from given page'''
-        author_bio = author_page.xpath('//div[@class="aboutAuthorInfo"]/span')
+        author_bio = AUTHOR_PAGE.extract(author_page, ['bio'])['bio']
         if not author_bio:
             return None
 
@@ -398,41 +514,42 @@ class GoodreadsParser(object):
         return unicode(re.sub(r'\s+', ' ', author_bio.text_content()).strip().decode('utf-8').encode('latin-1'))
 
     @staticmethod
-    def _get_author_image(author_page, encode_image=False):
-        '''Gets author's image url and image encoded into base64 from given page'''
-        image_url = author_page.xpath('//a[contains(@href, "/photo/author/")]/img')
-
-        if encode_image:
-            if not image_url:
-                return None, None
-            image = urlopen(image_url[0].get('src')).read()
-            encoded_image = base64.b64encode(image)
-            return image_url[0].get('src'), encoded_image
-        else:
-            if not image_url:
-                return None
-            return image_url[0].get('src')
-
-    def _get_author_other_books(self, author_info):
-        '''Gets author's other books from given page'''
-        if len(author_info) == 0:
-            return
+    def _get_author_image(author_page):
+        '''Gets author's image url from given page'''
+        image_url = AUTHOR_PAGE.extract(author_page, ['image'])['image']
+        if not image_url:
+            return None
+        return image_url[0].get('src')
 
+    def _read_author_other_books(self, author_page):
+        '''Gets (book id, tooltip info) for every book on author's page that has usable info'''
         book_info = []
-
-        for book in author_info[0]['page'].xpath('//tr[@itemtype="http://schema.org/Book"]'):
+        for book in AUTHOR_PAGE.extract(author_page, ['books'])['books']:
             book_id = book.find('td//div[@class="u-anchorTarget"]').get('id')
 
-            # don't want to add the current book to the other books list
-            if book_id == self._goodreads_book_id:
-                continue
-
             image_url = book.find('td//img[@class="bookSmallImg"]').get('src').split('/')
             image_url = '{0}/{1}l/{2}'.format('/'.join(image_url[:-2]), image_url[-2][:-1], image_url[-1])
 
             book_info.append((book_id, image_url))
 
-        self._author_recommendations = self._get_book_info_from_tooltips(book_info)
+        # the current book is kept so the list can be reused for the author's other books
+        tooltips = self._get_tooltips([info[0] for info in book_info])
+        other_books = []
+        for book_id, image_url in book_info:
+            if tooltips.get(book_id):
+                book_data = dict(tooltips[book_id])
+                book_data['imageUrl'] = image_url
+                other_books.append((book_id, book_data))
+        return other_books
+
+    def _get_author_other_books(self, author_info):
+        '''Gets author's other books from primary author's data'''
+        if len(author_info) == 0:
+            return
+
+        # don't want to add the current book to the other books list
+        self._author_recommendations = [book_data for book_id, book_data in author_info[0]['other_books']
+                                        if book_id != self._goodreads_book_id]
         self._author_other_books = [{'e': 1, 't': info['title'], 'a': info['asin']} for info in self._author_recommendations]
 
     def _get_customer_recommendations(self):
@@ -441,7 +558,7 @@ class GoodreadsParser(object):
             return
 
         book_info = []
-        for book in self._page_source.xpath('//div[@class="bookCarousel"]/div[@class="carouselRow"]/ul/li/a'):
+        for book in self._book_page['customer_recommendations']:
             book_url = book.get('href')
             book_id_search = BOOK_ID_PAT.search(book_url)
             book_id = book_id_search.group(1) if book_id_search else None
@@ -456,30 +573,65 @@ class GoodreadsParser(object):
         '''Gets books ASIN, title, authors, image url, description, and rating information'''
         if isinstance(book_info, tuple):
             book_info = [book_info]
-        books_data = []
-        link_pattern = 'resources[Book.{0}][type]=Book&resources[Book.{0}][id]={0}'
-        tooltips_page_url = '/tooltips?' + "&".join([link_pattern.format(book_id) for book_id, image_url in book_info])
-        tooltips_page_info = json.loads(open_url(self._connection, tooltips_page_url))['tooltips']
+        tooltips = self._get_tooltips([info[0] for info in book_info])
 
+        books_data = []
         for book_id, image_url in book_info:
-            book_data = tooltips_page_info['Book.{0}'.format(book_id)]
-            if not book_data:
-                continue
-            book_data = html.fromstring(book_data)
-            parsed_data = self._parse_tooltip_info(book_data, book_id, image_url)
-            if not parsed_data:
+            if not tooltips.get(book_id):
                 continue
+            parsed_data = dict(tooltips[book_id])
+            parsed_data['imageUrl'] = image_url
             books_data.append(parsed_data)
 
         return books_data
 
-    def _parse_tooltip_info(self, book_data, book_id, image_url):
+    def _get_tooltips(self, book_ids):
+        '''Gets parsed tooltip info for each book id; Only books that haven't been cached recently are fetched'''
+        tooltip_cache = get_cache('goodreads_tooltips', TOOLTIP_CACHE_SIZE)
+        tooltips = {}
+        missing_book_ids = []
+        for book_id in book_ids:
+            if tooltips.has_key(book_id) or book_id in missing_book_ids:
+                continue
+            entry = tooltip_cache.get(book_id)
+            if entry and entry[2] < TOOLTIP_TTL:
+                tooltips[book_id] = json.loads(entry[0])
+            else:
+                missing_book_ids.append(book_id)
+
+        # long tooltip urls are slow or get rejected so fetch them in chunks at the same time
+        chunks = [missing_book_ids[i:i + TOOLTIP_CHUNK_SIZE]
+                  for i in range(0, len(missing_book_ids), TOOLTIP_CHUNK_SIZE)]
+        for chunk_tooltips in self._task_pool.map(self._read_tooltips, chunks):
+            tooltips.update(chunk_tooltips)
+
+        return tooltips
+
+    def _read_tooltips(self, book_ids):
+        '''Fetches and parses tooltips for book ids; Caches the results, including books with no usable info'''
+        tooltip_cache = get_cache('goodreads_tooltips', TOOLTIP_CACHE_SIZE)
+        link_pattern = 'resources[Book.{0}][type]=Book&resources[Book.{0}][id]={0}'
+        tooltips_page_url = '/tooltips?' + "&".join([link_pattern.format(book_id) for book_id in book_ids])
+        tooltips_page_info = json.loads(self._page_cache.open_url(self._connection, tooltips_page_url))['tooltips']
+
+        tooltips = {}
+        for book_id in book_ids:
+            book_data = tooltips_page_info.get('Book.{0}'.format(book_id))
+            if not book_data:
+                continue
+            tooltips[book_id] = self._parse_tooltip_info(html.fromstring(book_data), book_id)
+            tooltip_cache.set(book_id, json.dumps(tooltips[book_id]))
+
+        return tooltips
+
+    def _parse_tooltip_info(self, book_data, book_id):
         '''Takes information retried from goodreads tooltips link and parses it'''
-        title = book_data.xpath('//a[contains(@class, "readable")]')
+        fields = TOOLTIP.extract(book_data)
+        title = fields['title']
         title = title[0].text if len(title) > 0 else None
-        authors = book_data.xpath('//a[contains(@class, "authorName")]')
+        authors = fields['authors']
         authors = [authors[0].text] if len(authors) > 0 else None
-        rating_info = book_data.xpath('//div[@class="bookRatingAndPublishing"]/span[@class="minirating"]')
+        rating_info = fields['rating']
         if len(rating_info) > 0:
             rating_string = rating_info[0].text_content().strip().replace(',', '').split()
             rating = float(rating_string[rating_string.index('avg')-1])
@@ -489,22 +641,21 @@ class GoodreadsParser(object):
             num_of_reviews = None
 
         try:
-            asin_elements = book_data.xpath('//a[contains(@class, "kindlePreviewButtonIcon")]/@href')
-            book_asin = urlparse.parse_qs(urlparse.urlsplit(asin_elements[0]).query)["asin"][0]
+            book_asin = urlparse.parse_qs(urlparse.urlsplit(fields['asin_links'][0]).query)["asin"][0]
         except (KeyError, IndexError):
             book_asin = None
 
         # We should get the ASIN from the tooltips file, but just in case we'll
         # keep this as a fallback (though this only works in some regions - just USA?)
         if not book_asin:
-            asin_data_page = open_url(self._connection, '/buttons/glide/' + book_id)
+            asin_data_page = self._page_cache.open_url(self._connection, '/buttons/glide/' + book_id)
             book_asin = GOODREADS_ASIN_PAT.search(asin_data_page)
             if not book_asin:
                 return None
             book_asin = book_asin.group(1)
 
-        desc = book_data.xpath('//div[@class="addBookTipDescription"]//span[not(contains(@id, "freeTextContainer"))]')
-        desc_backup = book_data.xpath('//div[@class="addBookTipDescription"]//span[contains(@id, "freeTextContainer")]')
+        desc = fields['description']
+        desc_backup = fields['description_backup']
         if len(desc) > 0:
             desc = re.sub(r'\s+', ' ', desc[0].text).strip()
         elif len(desc_backup) > 0:
@@ -516,7 +667,6 @@ class GoodreadsParser(object):
                 'asin': book_asin,
                 'title': title,
                 'authors': authors,
-                'imageUrl': image_url,
                 'description': desc,
                 'hasSample': False,
                 'amazonRating': rating,
@@ -524,7 +674,7 @@ class GoodreadsParser(object):
 
     def _get_book_image_url(self):
         '''Gets book's image url'''
-        image_url = self._page_source.xpath('//div[contains(concat(" ", @class, " "), " mainContent ")]//div[@id="imagecol"]//img[@id="coverImage"]')
+        image_url = self._book_page['image']
         if len(image_url) > 0:
             return image_url[0].get('src')
         return None
@@ -534,7 +684,7 @@ class GoodreadsParser(object):
         if self._page_source is None:
             return None
 
-        num_pages = self._page_source.xpath('//span[@itemprop="numberOfPages"]')
+        num_pages = self._book_page['num_pages']
         if len(num_pages) > 0:
             num_pages = int(num_pages[0].text.split()[0])
             total_minutes = num_pages * 2
@@ -0,0 +1,40 @@
+# html_parser.py
+'''Parses html pages, optionally stopping as soon as the parts of the page that are needed have been read'''
+
+from lxml import etree, html
+
+CHUNK_SIZE = 16 * 1024
+
+# closes after everything we read from goodreads pages; only headers, footers, and scripts come after it
+MAIN_CONTENT = (('div', 'class', 'mainContent'),)
+
+# closes after the main column of goodreads pages (setting descriptions, quotes)
+LEFT_CONTAINER = (('div', 'class', 'leftContainer'),)
+
+def parse_html(page, required=None):
+    '''
+    Parses page and returns its root element
+
+    required is a list of (tag, attribute, value) tuples. If given, page is fed to the parser in chunks and parsing
+    stops once an element matching each of them has been closed; The rest of the page is never parsed. If one of
+    them never shows up, the whole page is parsed like it would be without required.
+    '''
+    if not required or not hasattr(etree, 'HTMLPullParser'):
+        return html.fromstring(page)
+
+    parser = etree.HTMLPullParser(events=('end',))
+    parser.set_element_class_lookup(html.HtmlElementClassLookup())
+    remaining = list(required)
+    for start in range(0, len(page), CHUNK_SIZE):
+        parser.feed(page[start:start + CHUNK_SIZE])
+        for _, element in parser.read_events():
+            remaining = [node for node in remaining if not _matches(element, node)]
+        if len(remaining) == 0:
+            break
+
+    return parser.close()
+
+def _matches(element, node):
+    '''Checks if element is the tag given in node and has value as one of the words in its attribute'''
+    tag, attribute, value = node
+    return element.tag == tag and value in (element.get(attribute) or '').split()
@@ -0,0 +1,108 @@
+# http_cache.py
+'''Caches http responses on disk so pages fetched on previous runs don't need to be downloaded again'''
+
+import re
+import urllib
+import urlparse
+
+from calibre_plugins.xray_creator.lib.disk_cache import get_cache
+
+MAX_SIZE = 500 * 1024 * 1024
+REDIRECTS_MAX_SIZE = 10 * 1024 * 1024
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# how long a response or redirect stays fresh depending on what kind of page it is; first match wins
+RESOURCE_TTLS = [(re.compile(r'^/book/show/'), 7 * DAY),
+                 (re.compile(r'^/book/isbn/'), 30 * DAY),
+                 (re.compile(r'^/characters/'), 30 * DAY),
+                 (re.compile(r'^/places/'), 30 * DAY),
+                 (re.compile(r'^/work/quotes/'), 14 * DAY),
+                 (re.compile(r'^/author/show/'), 14 * DAY),
+                 (re.compile(r'^/tooltips'), 7 * DAY),
+                 (re.compile(r'^/buttons/glide/'), 30 * DAY),
+                 (re.compile(r'^/search'), 3 * DAY),
+                 (re.compile(r'^/s/'), 3 * DAY)]
+DEFAULT_TTL = DAY
+
+class CachedResponse(object):
+    '''Holds a cached response body along with what's needed to revalidate it'''
+    def __init__(self, body, metadata, fresh):
+        self._body = body
+        self._metadata = metadata
+        self._fresh = fresh
+
+    @property
+    def body(self):
+        return self._body
+
+    @property
+    def fresh(self):
+        return self._fresh
+
+    @property
+    def conditional_headers(self):
+        '''Headers that let the server answer with 304 Not Modified if the page hasn't changed'''
+        headers = {}
+        if self._metadata.get('etag'):
+            headers['If-None-Match'] = self._metadata['etag']
+        if self._metadata.get('last-modified'):
+            headers['If-Modified-Since'] = self._metadata['last-modified']
+        return headers
+
+class HTTPCache(object):
+    '''Looks up and stores responses and redirects for a single host'''
+    def __init__(self, host):
+        self._host = host.lower()
+        self._store = get_cache('http_responses', MAX_SIZE)
+        self._redirects = get_cache('http_redirects', REDIRECTS_MAX_SIZE)
+
+    def _key(self, url):
+        '''Normalizes url so the same page is always stored under the same key'''
+        parts = urlparse.urlsplit(url)
+        query = urllib.urlencode(sorted(urlparse.parse_qsl(parts.query, keep_blank_values=True)))
+        return '{0}{1}?{2}'.format(self._host, parts.path or '/', query)
+
+    @staticmethod
+    def ttl(url):
+        '''Returns how long the response for url stays fresh in seconds'''
+        path = urlparse.urlsplit(url).path
+        for pattern, ttl in RESOURCE_TTLS:
+            if pattern.search(path):
+                return ttl
+        return DEFAULT_TTL
+
+    def lookup(self, url):
+        '''Returns cached response for url or None if it isn't cached'''
+        entry = self._store.get(self._key(url))
+        if entry is None:
+            return None
+        body, metadata, age = entry
+        return CachedResponse(body, metadata, age < self.ttl(url))
+
+    def store(self, url, response):
+        '''Stores response for url along with its validators'''
+        self._store.set(self._key(url), response.body, self._validators(response))
+
+    def redirect(self, url):
+        '''Returns where url redirected to the last time it was requested; Returns None if that isn't known or is stale'''
+        entry = self._redirects.get(self._key(url))
+        if entry is None or entry[2] >= self.ttl(url):
+            return None
+        return entry[0]
+
+    def store_redirect(self, url, location):
+        '''Remembers that url redirects to location'''
+        self._redirects.set(self._key(url), location)
+
+    def revalidated(self, url, response):
+        '''Marks the cached response for url as fresh again after the server said it hasn't changed'''
+        validators = self._validators(response)
+        self._store.touch(self._key(url), validators if validators else None)
+
+    @staticmethod
+    def _validators(response):
+        '''Gets the headers needed to make a conditional request later'''
+        return dict((header, response.headers[header]) for header in ('etag', 'last-modified')
+                    if response.headers.has_key(header))
@@ -0,0 +1,67 @@
+# image_store.py
+'''Keeps downloaded images on disk so each image is downloaded and encoded once no matter how many books use it'''
+
+import os
+import base64
+import hashlib
+import threading
+
+from calibre_plugins.xray_creator.lib.transport import get_transport
+from calibre_plugins.xray_creator.lib.disk_cache import get_cache, CACHE_DIRECTORY
+
+IMAGE_DIRECTORY = os.path.join(CACHE_DIRECTORY, 'images')
+INDEX_SIZE = 5 * 1024 * 1024
+
+# how long we trust that an image url still points to the same image
+URL_TTL = 90 * 24 * 60 * 60
+
+class ImageStore(object):
+    '''
+    Content-addressed image store
+
+    Images are saved under the sha1 of their bytes, with an index from url to hash, so different urls for the same
+    image share one file. Encoded variants are saved next to the image the first time they are asked for.
+    '''
+    def __init__(self):
+        if not os.path.exists(IMAGE_DIRECTORY):
+            os.makedirs(IMAGE_DIRECTORY)
+        self._index = get_cache('image_urls', INDEX_SIZE)
+
+    def get_encoded_image(self, url):
+        '''Returns image at url encoded into base64'''
+        image_file = self._image_file(url)
+        encoded_file = image_file + '.b64'
+        if not os.path.exists(encoded_file):
+            with open(image_file, 'rb') as image:
+                self._write(encoded_file, base64.b64encode(image.read()))
+        with open(encoded_file, 'rb') as encoded_image:
+            return encoded_image.read()
+
+    def _image_file(self, url):
+        '''Returns path of the stored image for url, downloading it if url is new or hasn't been checked in a while'''
+        entry = self._index.get(url)
+        if entry:
+            digest, _, age = entry
+            image_file = os.path.join(IMAGE_DIRECTORY, digest)
+            if age < URL_TTL and os.path.exists(image_file):
+                return image_file
+
+        image = get_transport().read_url(url)
+        digest = hashlib.sha1(image).hexdigest()
+        image_file = os.path.join(IMAGE_DIRECTORY, digest)
+        if not os.path.exists(image_file):
+            self._write(image_file, image)
+        self._index.set(url, digest)
+        return image_file
+
+    @staticmethod
+    def _write(filename, data):
+        '''Writes data into filename without leaving a partial file behind if something goes wrong'''
+        temp_file = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(), threading.current_thread().ident)
+        with open(temp_file, 'wb') as temp_data:
+            temp_data.write(data)
+        try:
+            os.rename(temp_file, filename)
+        except OSError:
+            # another thread stored the same content first
+            os.remove(temp_file)
@@ -0,0 +1,69 @@
+# page_cache.py
+'''Shares page fetches and parsed pages between all the books in a job'''
+
+import threading
+from collections import OrderedDict
+
+from calibre_plugins.xray_creator.lib.task_pool import Task
+from calibre_plugins.xray_creator.lib.html_parser import parse_html
+from calibre_plugins.xray_creator.lib.utilities import open_url
+
+# number of finished results to keep; requests still in flight are never evicted so they are always shared
+MAX_ENTRIES = 200
+
+class PageCache(object):
+    '''
+    Makes sure each page is only fetched and parsed once
+
+    The first request for a key runs the fetch; requests for the same key that come in while it is running wait for
+    it and get the same result (or exception) instead of making their own request. Recent results are kept so
+    later books in the job reuse them too; failures are dropped once the callers waiting on them have been told, so
+    the next request tries again.
+    '''
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key, func, *args):
+        '''Returns result of func(*args), sharing it with every other caller that asks for key'''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = Task(func, args)
+            self._entries[key] = entry
+            if len(self._entries) > self._max_entries:
+                finished = [old_key for old_key, old_entry in self._entries.items() if old_entry.done]
+                for old_key in finished[:len(self._entries) - self._max_entries]:
+                    del self._entries[old_key]
+
+        try:
+            return entry.result()
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+
+    def open_url(self, connection, url):
+        '''Returns page's html'''
+        return self.get(('url', connection.host, self._normalize_url(url)), open_url, connection, url)
+
+    def open_html(self, connection, url, required=None):
+        '''Returns page parsed by lxml, only parsed as far as required (see parse_html); Returns None if page is empty'''
+        return self.get(('html', connection.host, self._normalize_url(url), required), self._read_html,
+                        connection, url, required)
+
+    def _read_html(self, connection, url, required):
+        '''Gets page's html and parses it'''
+        response = self.open_url(connection, url)
+        if not response:
+            return None
+        return parse_html(response, required)
+
+    @staticmethod
+    def _normalize_url(url):
+        '''Strips goodreads domain the same way open_url does so relative and absolute urls share an entry'''
+        if 'goodreads.com' in url:
+            return url[url.find('goodreads.com') + len('goodreads.com'):]
+        return url
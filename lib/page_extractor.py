@@ -0,0 +1,46 @@
+# page_extractor.py
+'''Extracts named fields from parsed pages using xpaths that are compiled once'''
+
+import threading
+from timeit import default_timer
+from collections import defaultdict
+
+from lxml import etree
+
+class PageSpec(object):
+    '''
+    Table of the fields to read from one kind of page
+
+    containers maps a name to an xpath for the part of the page some fields live in; It is located once per page.
+    fields maps a name to (container name, xpath); The xpath is evaluated relative to each node the container
+    matched, or relative to the page if container name is None. Time spent on each field is recorded in timings.
+    '''
+    def __init__(self, containers, fields):
+        self._containers = dict((name, etree.XPath(path)) for name, path in containers.items())
+        self._fields = dict((name, (container, etree.XPath(path))) for name, (container, path) in fields.items())
+        self._timings = defaultdict(float)
+        self._lock = threading.Lock()
+
+    @property
+    def timings(self):
+        '''Total seconds spent evaluating each field'''
+        with self._lock:
+            return dict(self._timings)
+
+    def extract(self, page, names=None):
+        '''Evaluates fields in names (all fields if not given) on page; Returns dict of field name to matches'''
+        located = {}
+        results = {}
+        for name in names if names else self._fields.keys():
+            start = default_timer()
+            container, xpath = self._fields[name]
+            if container is None:
+                nodes = [page]
+            else:
+                if not located.has_key(container):
+                    located[container] = self._containers[container](page)
+                nodes = located[container]
+            results[name] = [match for node in nodes for match in xpath(node)]
+            with self._lock:
+                self._timings[name] += default_timer() - start
+        return results
@@ -0,0 +1,55 @@
+# rate_limiter.py
+'''Limits how fast requests are sent to a host and backs off when the host pushes back'''
+
+import time
+import random
+import threading
+
+class RateLimiter(object):
+    '''
+    Token bucket shared by every thread sending requests to one host
+
+    The refill rate adapts to the host: it is halved every time the host throttles us or errors and creeps back up
+    after each successful request, staying between min_rate and max_rate requests per second.
+    '''
+    def __init__(self, rate=4.0, min_rate=0.25, max_rate=10.0, burst=4):
+        self._rate = rate
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def acquire(self):
+        '''Waits until a request is allowed to be sent'''
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+    def succeeded(self):
+        '''Speeds up a little after the host handled a request fine'''
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + 0.1)
+
+    def throttled(self):
+        '''Slows down after the host throttled us or failed; Also empties the bucket so nothing goes out right away'''
+        with self._lock:
+            self._rate = max(self._min_rate, self._rate / 2)
+            self._tokens = 0
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    '''Returns how long to wait before retry number attempt (starting at 0) using exponential backoff with jitter'''
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
@@ -16,6 +16,7 @@ class StatusInfo(object):
     F_LOCAL_BOOK_NOT_FOUND = 'Local book not found.'
     F_NO_APPROPRIATE_LOCAL_BOOK_FOUND = 'No local book of the chosen formats was found.'
     F_COULD_NOT_PARSE_GOODREADS_DATA = 'Could not parse Goodreads data.'
+    F_JOB_ABORTED = 'Job aborted.'
     F_UNABLE_TO_PARSE_BOOK = 'Unable to parse book.'
     F_REMOVE_LOCAL_XRAY = 'Unable to remove local x-ray.'
     F_PREFS_NOT_OVERWRITE_LOCAL_XRAY = 'Local x-ray found. Your preferences are set to not ovewrite if one already exists.'
@@ -0,0 +1,108 @@
+# task_pool.py
+'''Runs functions concurrently on a bounded number of worker threads'''
+
+import threading
+from Queue import Queue, Empty
+
+from calibre_plugins.xray_creator.lib.exceptions import JobAborted
+
+DEFAULT_WORKERS = 4
+
+# workers exit after being idle this long so pools don't need to be shut down
+IDLE_TIMEOUT = 5
+
+class Task(object):
+    '''Function submitted to a TaskPool along with its result once it has run'''
+    def __init__(self, func, args, abort=None):
+        self._func = func
+        self._args = args
+        self._abort = abort
+        self._claimed = False
+        self._claim_lock = threading.Lock()
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+
+    @property
+    def done(self):
+        '''Whether task has finished running'''
+        return self._done.isSet()
+
+    def claim(self):
+        '''Marks task as started; Returns False if another thread already started it'''
+        with self._claim_lock:
+            if self._claimed:
+                return False
+            self._claimed = True
+            return True
+
+    def run(self):
+        '''Runs function and saves its result or the exception it raised; Skips it if the job was aborted'''
+        if self._abort is not None and self._abort.isSet():
+            self._exception = JobAborted('Job aborted.')
+            self._done.set()
+            return
+
+        try:
+            self._result = self._func(*self._args)
+        except Exception as exception:
+            self._exception = exception
+        self._done.set()
+
+    def result(self):
+        '''Waits for task to finish and returns its result; Raises the task's exception if it raised one'''
+        # if no worker has picked this task up yet, run it here instead of waiting; this also means tasks
+        # that wait on other tasks from inside a worker can't deadlock the pool
+        if self.claim():
+            self.run()
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+class TaskPool(object):
+    '''Runs submitted tasks on at most max_workers threads; Tasks that haven't started when abort is set are skipped'''
+    def __init__(self, max_workers=DEFAULT_WORKERS, abort=None):
+        self._max_workers = max_workers
+        self._abort = abort
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._num_of_workers = 0
+        self._num_of_idle_workers = 0
+
+    def submit(self, func, *args):
+        '''Queues func to be run with args and returns its task'''
+        task = Task(func, args, self._abort)
+        self._queue.put(task)
+        with self._lock:
+            if self._num_of_idle_workers < self._queue.qsize() and self._num_of_workers < self._max_workers:
+                self._num_of_workers += 1
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+        return task
+
+    def map(self, func, items):
+        '''Runs func on each item concurrently and returns the results in the same order as items'''
+        tasks = [self.submit(func, item) for item in items]
+        return [task.result() for task in tasks]
+
+    def _work(self):
+        '''Runs queued tasks until there have been none for a while'''
+        while True:
+            with self._lock:
+                self._num_of_idle_workers += 1
+            try:
+                task = self._queue.get(timeout=IDLE_TIMEOUT)
+            except Empty:
+                with self._lock:
+                    self._num_of_idle_workers -= 1
+                    if self._queue.empty():
+                        self._num_of_workers -= 1
+                        return
+                continue
+
+            with self._lock:
+                self._num_of_idle_workers -= 1
+            if task.claim():
+                task.run()
@@ -0,0 +1,134 @@
+# transport.py
+'''Sends requests for open_url and image downloads; Can record a run's requests and replay them offline'''
+
+import os
+import json
+import hashlib
+import threading
+from urllib2 import build_opener, ProxyHandler
+
+from calibre import get_proxies
+
+from calibre_plugins.xray_creator.lib.exceptions import PageDoesNotExist
+from calibre_plugins.xray_creator.lib.connection_pool import Response
+
+# set to "record:<directory>" or "replay:<directory>" to record or replay every request the plugin makes
+TRANSPORT_ENVIRONMENT_VARIABLE = 'XRAY_CREATOR_TRANSPORT'
+
+_TRANSPORT = None
+_TRANSPORT_LOCK = threading.Lock()
+
+def get_transport():
+    '''Returns the transport in use, creating it from the environment variable the first time'''
+    global _TRANSPORT
+    with _TRANSPORT_LOCK:
+        if _TRANSPORT is None:
+            mode, _, directory = os.environ.get(TRANSPORT_ENVIRONMENT_VARIABLE, '').partition(':')
+            if mode == 'record' and directory:
+                _TRANSPORT = RecordingTransport(directory)
+            elif mode == 'replay' and directory:
+                _TRANSPORT = ReplayTransport(directory)
+            else:
+                _TRANSPORT = NetworkTransport()
+        return _TRANSPORT
+
+def set_transport(transport):
+    '''Replaces the transport in use'''
+    global _TRANSPORT
+    with _TRANSPORT_LOCK:
+        _TRANSPORT = transport
+
+class NetworkTransport(object):
+    '''Sends requests over the network'''
+    # whether open_url should use the rate limiter and get_cache should return persistent caches with this transport
+    online = True
+    use_cache = True
+
+    @staticmethod
+    def request(connection, url, headers):
+        '''Sends GET request for url on connection and returns the response'''
+        return connection.request('GET', url, headers)
+
+    @staticmethod
+    def read_url(url):
+        '''Downloads url through calibre's proxies, used for urls that aren't on a pooled host like author images'''
+        return build_opener(ProxyHandler(get_proxies(debug=False))).open(url).read()
+
+class RecordingTransport(NetworkTransport):
+    '''Sends requests over the network and saves every response into directory so it can be replayed later'''
+    # any persistent cache would hide requests from the recording
+    use_cache = False
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._index = _read_index(directory)
+        if not os.path.exists(os.path.join(directory, 'bodies')):
+            os.makedirs(os.path.join(directory, 'bodies'))
+
+    def request(self, connection, url, headers):
+        '''Sends GET request for url on connection, records the response, and returns it'''
+        response = NetworkTransport.request(connection, url, headers)
+        self._record(_key(connection.host, url), response.status, response.headers, response.body)
+        return response
+
+    def read_url(self, url):
+        '''Downloads url and records it'''
+        body = NetworkTransport.read_url(url)
+        self._record(_key(None, url), 200, {}, body)
+        return body
+
+    def _record(self, key, status, headers, body):
+        '''Saves response body into its own file and its status and headers into the index'''
+        body_file = os.path.join('bodies', hashlib.sha1(key).hexdigest())
+        with self._lock:
+            with open(os.path.join(self._directory, body_file), 'wb') as body_data:
+                body_data.write(body)
+            self._index[key] = {'status': status, 'headers': headers, 'body': body_file}
+            index_file = os.path.join(self._directory, 'index.json')
+            with open(index_file + '.tmp', 'w') as index_data:
+                json.dump(self._index, index_data, indent=1, sort_keys=True)
+            if os.path.exists(index_file):
+                os.remove(index_file)
+            os.rename(index_file + '.tmp', index_file)
+
+class ReplayTransport(object):
+    '''Answers requests from a directory saved by RecordingTransport without touching the network'''
+    online = False
+    use_cache = False
+
+    def __init__(self, directory):
+        self._directory = directory
+        self._index = _read_index(directory)
+
+    def request(self, connection, url, headers):
+        '''Returns recorded response for url'''
+        entry = self._entry(_key(connection.host, url))
+        return Response(entry['status'], entry['headers'], self._read_body(entry))
+
+    def read_url(self, url):
+        '''Returns recorded body for url'''
+        return self._read_body(self._entry(_key(None, url)))
+
+    def _entry(self, key):
+        '''Finds key in the index; Requests that weren't recorded are treated like missing pages'''
+        if not self._index.has_key(key):
+            raise PageDoesNotExist('Request was not recorded: {0}'.format(key))
+        return self._index[key]
+
+    def _read_body(self, entry):
+        '''Reads recorded body'''
+        with open(os.path.join(self._directory, entry['body']), 'rb') as body_data:
+            return body_data.read()
+
+def _key(host, url):
+    '''Key a request is recorded under'''
+    return 'GET {0}{1}'.format(host or '', url)
+
+def _read_index(directory):
+    '''Reads index of a recording; Returns an empty index if there isn't one yet'''
+    index_file = os.path.join(directory, 'index.json')
+    if not os.path.exists(index_file):
+        return {}
+    with open(index_file, 'r') as index_data:
+        return json.load(index_data)
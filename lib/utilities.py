@@ -8,45 +8,99 @@ import socket
 from httplib import HTTPException
 from calibre.library import current_library_path
 from calibre_plugins.xray_creator.lib.exceptions import PageDoesNotExist
+from calibre_plugins.xray_creator.lib.http_cache import HTTPCache
+from calibre_plugins.xray_creator.lib.rate_limiter import backoff_delay
+from calibre_plugins.xray_creator.lib.transport import get_transport
 
 HEADERS = {"Content-type": "application/x-www-form-urlencoded", "Accept": "text/html",
            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; WOW64; rv:46.0) Gecko/20100101 Firefox/46.0"}
 
 BOOK_ID_PAT = re.compile(r'\/show\/([\d]+)')
-AMAZON_ASIN_PAT = re.compile(r'data\-asin=\"([a-zA-z0-9]+)\"')
 GOODREADS_ASIN_PAT = re.compile(r'"asin":"(.+?)"')
 GOODREADS_URL_PAT = re.compile(r'href="(\/book\/show\/.+?)"')
 
 LIBRARY = current_library_path().replace('/', os.sep)
 
-def open_url(connection, url, return_redirect_url=False):
-    '''Tries to open url and return page's html'''
+MAX_RETRIES = 4
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+def open_url(connection, url, return_redirect_url=False, force=False):
+    '''
+    Tries to open url using connection pool and return page's html; Uses cached page if it's still fresh
+
+    force asks the server even if the cached page or redirect is still fresh; The response is still cached.
+    return_redirect_url returns where url redirects to instead of following it, or None if it doesn't redirect.
+    '''
     if 'goodreads.com' in url:
         url = url[url.find('goodreads.com') + len('goodreads.com'):]
-    try:
-        connection.request('GET', url, headers=HEADERS)
-        response = connection.getresponse()
-        if response.status == 301 or response.status == 302:
-            if return_redirect_url:
-                return response.msg['location']
-            response = open_url(connection, response.msg['location'])
-        else:
-            response = response.read()
-    except (HTTPException, socket.error):
-        time.sleep(1)
-        connection.close()
-        connection.connect()
-        connection.request('GET', url, headers=HEADERS)
-        response = connection.getresponse()
+
+    cache = HTTPCache(connection.host)
+
+    # known redirects are followed without asking the server again
+    location = cache.redirect(url) if not force else None
+    if location:
+        if return_redirect_url:
+            return location
+        return open_url(connection, location)
+
+    # only a redirect is wanted so pages are neither read from nor saved in the cache
+    cached_response = cache.lookup(url) if not return_redirect_url else None
+    if cached_response and cached_response.fresh and not force:
+        response = cached_response.body
+    else:
+        headers = dict(HEADERS)
+        if cached_response:
+            headers.update(cached_response.conditional_headers)
+        response = _request(connection, url, headers)
+
         if response.status == 301 or response.status == 302:
+            cache.store_redirect(url, response.headers['location'])
             if return_redirect_url:
-                return response.msg['location']
-            response = open_url(connection, response.msg['location'])
+                return response.headers['location']
+            response = open_url(connection, response.headers['location'], force=force)
+        elif return_redirect_url:
+            return None
+        elif response.status == 304 and cached_response:
+            cache.revalidated(url, response)
+            response = cached_response.body
         else:
-            response = response.read()
-
+            if response.status == 200:
+                cache.store(url, response)
+            response = response.body
 
     if 'Page Not Found' in response:
         raise PageDoesNotExist('Page not found.')
 
     return response
+
+def _request(connection, url, headers):
+    '''Sends GET request for url; Retries with backoff if it fails or the host is throttling us'''
+    transport = get_transport()
+    if not transport.online:
+        return transport.request(connection, url, headers)
+
+    rate_limiter = connection.rate_limiter
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        try:
+            # the pool drops connections that error so a retry will use a fresh one
+            response = transport.request(connection, url, headers)
+        except (HTTPException, socket.error):
+            if attempt == MAX_RETRIES:
+                raise
+            rate_limiter.throttled()
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status not in RETRY_STATUSES:
+            rate_limiter.succeeded()
+            return response
+        if attempt == MAX_RETRIES:
+            return response
+
+        rate_limiter.throttled()
+        delay = backoff_delay(attempt)
+        retry_after = response.headers.get('retry-after', '')
+        if retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        time.sleep(delay)
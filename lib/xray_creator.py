@@ -10,13 +10,17 @@ from collections import defaultdict
 
 from calibre.customize.ui import device_plugins
 from calibre.devices.scanner import DeviceScanner
+from calibre_plugins.xray_creator.lib.task_pool import TaskPool, Task
+from calibre_plugins.xray_creator.lib.page_cache import PageCache
 from calibre_plugins.xray_creator.lib.status_info import StatusInfo
+from calibre_plugins.xray_creator.lib.goodreads_parser import PAGE_SPECS
 
 class XRayCreator(object):
     '''Automates x-ray, author profile, start actions, and end actions creation and sending to device'''
-    def __init__(self, books, settings):
+    def __init__(self, books, settings, connections=None):
         self._books = books
         self._settings = settings
+        self._connections = connections
         self._num_of_formats_found_on_device = -1
         self._total_not_failing = None
 
@@ -42,6 +46,29 @@ class XRayCreator(object):
             book_lookup.pop(uuid)
         return self._find_device_books(book_lookup, log)
 
+    def _share_goodreads_data(self, abort, task_pool, page_cache):
+        '''
+        Groups books by goodreads url and ASIN so each group's goodreads data is only parsed once
+
+        Returns dict of book id to a Task that parses the group's data; Books that aren't in a group aren't included.
+        '''
+        groups = defaultdict(list)
+        for book in self.books_not_failing():
+            groups[(book.goodreads_url, book.asin)].append(book)
+
+        goodreads_data = {}
+        for books in groups.values():
+            if len(books) < 2:
+                continue
+            # parsed for every file the user's settings ask for so it has what any book in the group needs
+            task = Task(books[0].read_goodreads_data,
+                        (task_pool, page_cache, self._settings['create_send_xray'],
+                         self._settings['create_send_author_profile'], self._settings['create_send_start_actions'],
+                         self._settings['create_send_end_actions']), abort=abort)
+            for book in books:
+                goodreads_data[book.book_id] = task
+        return goodreads_data
+
     def books_not_failing(self):
         '''Gets books that didn't fail'''
         for book in self._books:
@@ -260,6 +287,8 @@ class XRayCreator(object):
         '''Creates files depending on users settings'''
         log('\n%s Initializing...' % datetime.now().strftime('%m-%d-%Y %H:%M:%S'))
         notifications.put((0.01, 'Initializing...'))
+        transfer_totals = self._get_transfer_totals()
+        extraction_times = self._get_extraction_times()
         device_books = self._initialize_books(log, database)
 
         actions = 1.0
@@ -276,14 +305,23 @@ class XRayCreator(object):
         if self._settings['send_to_device'] and device_books is not None:
             actions += 1
         total_not_failing_actions = self._total_not_failing * actions
+
+        # all books share one pool so goodreads requests are bounded for the whole job and one page cache so
+        # pages that several books need (author pages, author images) are only fetched and parsed once
+        task_pool = TaskPool(abort=abort)
+        page_cache = PageCache()
+        goodreads_data = self._share_goodreads_data(abort, task_pool, page_cache)
         for book_num, book in enumerate(self.books_not_failing()):
             if abort.isSet():
                 return
             log('%s %s' % (datetime.now().strftime('%m-%d-%Y %H:%M:%S'), book.title_and_author))
             book.create_files_event((device_books, book_num * actions, total_not_failing_actions), log,
-                                    notifications, abort)
+                                    notifications, abort, task_pool=task_pool, page_cache=page_cache,
+                                    goodreads_data=goodreads_data.get(book.book_id))
 
         self.print_create_results(log, device_books)
+        self.print_transfer_stats(log, transfer_totals)
+        self.print_extraction_stats(log, extraction_times)
 
     def print_create_results(self, log, device_books):
         '''Gets and prints create results'''
@@ -315,6 +353,52 @@ class XRayCreator(object):
                         for line in send_failed:
                             log('        %s' % line)
 
+    def _get_transfer_totals(self):
+        '''Gets bytes received and bytes of decompressed pages for each connection so far'''
+        if not self._connections:
+            return {}
+        return dict((name, (connection.bytes_received, connection.bytes_decoded))
+                    for name, connection in self._connections.items())
+
+    def print_transfer_stats(self, log, starting_totals):
+        '''Prints how much was downloaded since starting_totals compared to the size of the uncompressed pages'''
+        lines = []
+        for name, (received, decoded) in sorted(self._get_transfer_totals().items()):
+            received -= starting_totals[name][0]
+            decoded -= starting_totals[name][1]
+            if decoded == 0:
+                continue
+            lines.append('    {0}: {1:.1f} KB received for {2:.1f} KB of pages ({3:.0%} saved by compression)'.format(
+                name, received / 1024.0, decoded / 1024.0, 1 - float(received) / decoded))
+
+        if len(lines) > 0:
+            log('\nDownloads:')
+            for line in lines:
+                log(line)
+
+    @staticmethod
+    def _get_extraction_times():
+        '''Gets seconds spent extracting each field of each kind of goodreads page so far'''
+        return dict((name, spec.timings) for name, spec in PAGE_SPECS.items())
+
+    def print_extraction_stats(self, log, starting_times):
+        '''Prints time spent extracting fields from each kind of goodreads page since starting_times'''
+        lines = []
+        for name, timings in sorted(self._get_extraction_times().items()):
+            field_times = dict((field, seconds - starting_times[name].get(field, 0))
+                               for field, seconds in timings.items())
+            total = sum(field_times.values())
+            if total == 0:
+                continue
+            slowest = max(field_times, key=field_times.get)
+            lines.append('    {0}: {1:.2f} s (slowest field: {2}, {3:.2f} s)'.format(name, total, slowest,
+                                                                                    field_times[slowest]))
+
+        if len(lines) > 0:
+            log('\nPage Extraction:')
+            for line in lines:
+                log(line)
+
     def send_files_event(self, database, abort, log, notifications):
         '''Sends files depending on users settings'''
         log('\n%s Initializing...' % datetime.now().strftime('%m-%d-%Y %H:%M:%S'))
@@ -332,11 +416,16 @@ class XRayCreator(object):
                  'It may have been ejected but not unplugged.').format(datetime.now().strftime('%m-%d-%Y %H:%M:%S')))
             return
 
+        task_pool = TaskPool(abort=abort)
+        page_cache = PageCache()
+        goodreads_data = self._share_goodreads_data(abort, task_pool, page_cache)
         for book_num, book in enumerate(self.books_not_failing()):
             if abort.isSet():
                 return
             log('%s %s' % (datetime.now().strftime('%m-%d-%Y %H:%M:%S'), book.title_and_author))
-            book.send_files_event((device_books, float(book_num), self._total_not_failing), log, notifications, abort)
+            book.send_files_event((device_books, float(book_num), self._total_not_failing), log, notifications, abort,
+                                  task_pool=task_pool, page_cache=page_cache,
+                                  goodreads_data=goodreads_data.get(book.book_id))
 
         send_completed, send_failed = self.get_results_send()
         if len(send_completed) > 0:
@@ -9,7 +9,6 @@ __license__ = 'GPL v3'
 __copyright__ = '2016, Samreen Zarroug, Anthony Toole, & Alex Mayer'
 __docformat__ = 'restructuredtext en'
 
-from httplib import HTTPSConnection
 from PyQt5.Qt import QMenu, QToolButton
 
 from calibre import get_proxies
@@ -20,10 +19,11 @@ from calibre.gui2.threaded_jobs import ThreadedJob
 
 from calibre.customize.zipplugin import get_icons
 from calibre_plugins.xray_creator.lib.book import Book
+from calibre_plugins.xray_creator.lib.connection_pool import ConnectionPool
 from calibre_plugins.xray_creator.config import __prefs__ as settings
 from calibre_plugins.xray_creator.book_config import BookConfigWidget
 from calibre_plugins.xray_creator.lib.xray_creator import XRayCreator
-from calibre_plugins.xray_creator.lib.book_settings import BookSettings
+from calibre_plugins.xray_creator.lib.book_settings import resolve_book_settings
 
 class XRayCreatorInterfacePlugin(InterfaceAction):
     '''Initializes plugin's interface'''
@@ -38,18 +38,13 @@ class XRayCreatorInterfacePlugin(InterfaceAction):
         InterfaceAction.__init__(self, parent, site_customization)
 
         https_proxy = get_proxies(debug=False).get('https', None)
+        proxy = None
         if https_proxy:
-            https_address = ':'.join(https_proxy.split(':')[:-1])
-            https_port = int(https_proxy.split(':')[-1])
-            goodreads_conn = HTTPSConnection(https_address, https_port)
-            goodreads_conn.set_tunnel('www.goodreads.com', 443)
-            amazon_conn = HTTPSConnection(https_address, https_port)
-            amazon_conn.set_tunnel('www.amazon.com', 443)
-        else:
-            goodreads_conn = HTTPSConnection('www.goodreads.com')
-            amazon_conn = HTTPSConnection('www.amazon.com')
-
-        self._connections = {'goodreads': goodreads_conn, 'amazon': amazon_conn}
+            proxy = (':'.join(https_proxy.split(':')[:-1]), int(https_proxy.split(':')[-1]))
+
+        # pools are thread safe so create and send jobs running at the same time can share them
+        self._connections = {'goodreads': ConnectionPool('www.goodreads.com', proxy=proxy),
+                             'amazon': ConnectionPool('www.amazon.com', proxy=proxy)}
         self.menu = QMenu(self.gui)
 
     def genesis(self):
@@ -101,13 +96,11 @@ class XRayCreatorInterfacePlugin(InterfaceAction):
 
         book_ids = list(map(self.gui.library_view.model().id, rows))
 
-        book_settings_list = []
-        for book_id in book_ids:
-            book_settings = BookSettings(database, book_id, self._connections)
+        book_settings_list = resolve_book_settings(database, book_ids, self._connections)
+        for book_settings in book_settings_list:
             if len(book_settings.aliases) == 0 and book_settings.goodreads_url != '':
                 book_settings.update_aliases(book_settings.goodreads_url)
                 book_settings.save()
-            book_settings_list.append(book_settings)
 
         BookConfigWidget(self.gui, book_settings_list)
 
@@ -132,10 +125,10 @@ class XRayCreatorInterfacePlugin(InterfaceAction):
 
         # Initialize each book's information
         books = []
-        for book_id in book_ids:
-            books.append(Book(database, book_id, self._connections, settings))
+        for book_settings in resolve_book_settings(database, book_ids, self._connections):
+            books.append(Book(database, book_settings.book_id, self._connections, settings, book_settings=book_settings))
 
-        return XRayCreator(books, settings)
+        return XRayCreator(books, settings, self._connections)
 
     def config(self):
         '''Opens up a dialog that allows user to set general preferences'''